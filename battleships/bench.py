@@ -0,0 +1,514 @@
+"""
+Benchmark suite, run as python -m battleships.bench
+
+    run      runs micro and macro benchmarks and saves them as JSON baseline
+    compare  compares two baselines and flags statistically significant regressions
+    latency  reports percentiles of the turn latency of every player, optionally with a time budget per shot
+    imports  checks that importing a module stays within an import time budget, fails if it doesn't
+    scoremap checks that Dense keeps its score map exact when shots run out of time, fails if it doesn't
+    sampler  checks the MonteCarlo layout sampler against exact enumeration on small boards, fails if it is off
+
+Micro benchmarks time single operations of BaseGame and the players, macro benchmarks time full MPLoop games of
+every player pairing for each board size and spacer setting.
+Every benchmark is repeated, each repeat gives one sample of seconds per operation or per game.
+"""
+from argparse import ArgumentParser
+from datetime import datetime
+from itertools import product
+from math import sqrt, lgamma, exp, log
+from random import Random
+from time import perf_counter
+import subprocess
+import platform
+import json
+import sys
+import os
+
+from battleships.util.selector import Selector
+from battleships.player.montecarlo import LayoutSampler
+from battleships.util.timing import Timings
+from battleships.loop.mploop import MPLoop
+
+
+PLAYERS = ("Random", "Hunter", "Dense")  # benchmarked by default
+CHOICES = PLAYERS + ("MonteCarlo",)  # MonteCarlo takes milliseconds per shot, it is only benchmarked on request
+
+
+class Setup(Selector):
+    """
+    Settings of a single benchmark, provides seeded players and games through Selector.
+    """
+    def __init__(self, size: tuple[int, int], use_spacer: bool, ships: list[int], bitboard=False, seed=0):
+        super().__init__()
+        self.size = size
+        self.use_spacer = use_spacer
+        self.ships = ships
+        self.bitboard = bitboard
+        self.seed = seed
+
+    def get_player(self, selector):
+        return {
+            "Random": self.random,
+            "Hunter": self.hunter,
+            "Dense": self.dense,
+            "MonteCarlo": self.montecarlo,
+        }[selector]()
+
+    def placed(self, n: int) -> list:  # n games with a random fleet on them
+        games = [self.base() for _ in range(n)]
+        for game in games:
+            game.random_placement(self.ships)
+        return games
+
+
+class Bench:
+    """
+    Expects board sizes, spacer settings, ships, the number of repeats and the amount of work per repeat.
+    Results are kept in self.results as name -> summary of the samples.
+    """
+    def __init__(self, sizes: list[int], spacers: list[bool], ships: list[int], repeats=5, n=200, episodes=50,
+                 bitboard=False, seed=0, players=PLAYERS):
+        self.sizes = sizes
+        self.spacers = spacers
+        self.ships = ships
+        self.repeats = repeats
+        self.n = n  # boards per micro benchmark repeat
+        self.episodes = episodes  # games per macro benchmark repeat
+        self.bitboard = bitboard
+        self.seed = seed
+        self.players = players
+        self.results = {}
+
+    def setup(self, size: int, spacer: bool) -> Setup:
+        return Setup((size, size), spacer, self.ships.copy(), self.bitboard, self.seed)
+
+    def record(self, name: str, samples: list[float], unit="s/op"):
+        self.results[name] = summary(samples, unit)
+        print(f"{name:<48} {format_time(self.results[name]['mean'])} ± {format_time(self.results[name]['std'])}")
+
+    def sample(self, name: str, run, unit="s/op"):
+        # run returns (seconds, operations) of one repeat
+        samples = []
+        for _ in range(self.repeats):
+            seconds, ops = run()
+            samples.append(seconds / ops)
+        self.record(name, samples, unit)
+
+    def micro(self):
+        for size, spacer in product(self.sizes, self.spacers):
+            setup = self.setup(size, spacer)
+            tag = f"{size}x{size}{' spacer' if spacer else ''}"
+            self.sample(f"shoot [{tag}]", lambda: self.shoot(setup))
+            self.sample(f"set_ship [{tag}]", lambda: self.set_ship(setup))
+            self.sample(f"random_placement [{tag}]", lambda: self.random_placement(setup))
+            self.sample(f"calculate_combinations [{tag}]", lambda: self.calculate_combinations(setup))
+            for player in self.players:
+                self.sample(f"{player}.shoot_nc [{tag}]", lambda: self.shoot_nc(setup, player))
+
+    def shoot(self, setup: Setup):
+        games = setup.placed(self.n)
+        rng = Random(self.seed)
+        orders = [rng.sample(range(game.size), game.size) for game in games]  # whole board, random order
+        start = perf_counter()
+        for game, order in zip(games, orders):
+            shoot = game.shoot
+            for pos in order:
+                shoot(pos)
+        return perf_counter() - start, sum(len(order) for order in orders)
+
+    def set_ship(self, setup: Setup):
+        games = setup.placed(self.n)
+        fleets = [game.ships for game in games]
+        for game in games:
+            game.reset()
+        start = perf_counter()
+        for game, fleet in zip(games, fleets):
+            for ship in fleet:
+                game.set_ship(ship)
+        return perf_counter() - start, sum(len(fleet) for fleet in fleets)
+
+    def random_placement(self, setup: Setup):
+        game = setup.base()
+        seconds = 0.
+        for _ in range(self.n):
+            game.reset()
+            start = perf_counter()
+            game.random_placement(setup.ships)
+            seconds += perf_counter() - start
+        return seconds, self.n
+
+    def calculate_combinations(self, setup: Setup):
+        game = setup.base()
+        start = perf_counter()
+        for _ in range(self.n):
+            for ship in setup.ships:
+                game.calculate_combinations(ship)
+        return perf_counter() - start, self.n * len(setup.ships)
+
+    def shoot_nc(self, setup: Setup, name: str):
+        player, other = setup.get_player(name), setup.get_player("Random")
+        player.initialize(other)
+        seconds, shots = 0., 0
+        for i in range(max(1, self.n // 20)):  # whole games, a shot depends on the ones before it
+            player.seed(f"{self.seed}:{i}:player")
+            other.seed(f"{self.seed}:{i}:other")
+            MPLoop.prepare(player)
+            MPLoop.prepare(other)
+            shoot_nc = player.shoot_nc
+            start = perf_counter()
+            while not other.game.game_over:
+                shoot_nc(other)
+                shots += 1
+            seconds += perf_counter() - start
+            MPLoop.reset(player)
+            MPLoop.reset(other)
+        return seconds, shots
+
+    def macro(self):
+        for size, spacer in product(self.sizes, self.spacers):
+            tag = f"{size}x{size}{' spacer' if spacer else ''}"
+            for p1, p2 in product(self.players, repeat=2):
+                self.sample(f"MPLoop {p1} vs {p2} [{tag}]", lambda: self.games(size, spacer, p1, p2), "s/game")
+
+    def games(self, size: int, spacer: bool, p1: str, p2: str):
+        setup = self.setup(size, spacer)
+        loop = MPLoop(setup.get_player(p1), setup.get_player(p2), self.episodes, seed=self.seed)
+        start = perf_counter()
+        loop.game_loop()
+        return perf_counter() - start, self.episodes
+
+    def latency(self, budget=None) -> Timings:
+        """
+        Parameters:
+            budget: float or None, seconds per shot, see GameUtil.shoot_within
+        Plays (episodes) games of every player against Random for each board size and spacer setting and returns the
+        latency of every turn of the player, the percentiles are stored in self.results.
+        """
+        timings = Timings()
+        budget = 1e9 if budget is None else budget  # never runs out
+        for size, spacer in product(self.sizes, self.spacers):
+            tag = f"{size}x{size}{' spacer' if spacer else ''}"
+            for player in self.players:
+                setup = self.setup(size, spacer)
+                loop = MPLoop(setup.get_player(player), setup.get_player("Random"), self.episodes, seed=self.seed,
+                              budget=budget, latencies=Timings())
+                loop.game_loop()
+                name = f"{player} turn [{tag}]"
+                timings.latencies[name] = loop.latencies.latencies[f"{player} turn [p1]"]
+                self.results[name] = timings.percentiles(name)
+        return timings
+
+    def dump(self, path: str, argv: list[str]):
+        data = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": argv,
+            "results": self.results,
+        }
+        with open(path, "w") as file:
+            file.write(json.dumps(data, indent=4))
+
+
+def summary(samples: list[float], unit: str) -> dict:
+    n = len(samples)
+    mean = sum(samples) / n
+    var = sum((x - mean) ** 2 for x in samples) / (n - 1) if n > 1 else 0.
+    data = {"unit": unit, "n": n, "mean": mean, "std": sqrt(var), "samples": samples}
+    if unit == "s/game":
+        data["games/s"] = 1 / mean if mean else None
+    return data
+
+
+def format_time(seconds: float) -> str:
+    for unit, factor in (("s", 1), ("ms", 1e3), ("μs", 1e6)):
+        if seconds >= 1 / factor:
+            return f"{seconds * factor:9.3f} {unit:<2}"
+    return f"{seconds * 1e9:9.3f} ns"
+
+
+def welch(a: dict, b: dict) -> tuple[float, float]:
+    """
+    Parameters:
+        a: dict, summary of the baseline
+        b: dict, summary of the new run
+    Welch's t-test for unequal variances, returns t and the two sided p-value.
+    """
+    va, vb = a["std"] ** 2 / a["n"], b["std"] ** 2 / b["n"]
+    if not va + vb:
+        return 0., 1. if a["mean"] == b["mean"] else 0.
+    t = (b["mean"] - a["mean"]) / sqrt(va + vb)
+    df = (va + vb) ** 2 / (va ** 2 / max(a["n"] - 1, 1) + vb ** 2 / max(b["n"] - 1, 1))  # Welch–Satterthwaite
+    return t, betainc(df / 2, .5, df / (df + t * t))  # P(|T| > |t|) of Student's t with df degrees of freedom
+
+
+def betainc(a: float, b: float, x: float) -> float:  # regularized incomplete beta function, continued fraction
+    if x <= 0 or x >= 1:
+        return float(x >= 1)
+    front = exp(lgamma(a + b) - lgamma(a) - lgamma(b) + a * log(x) + b * log(1 - x))
+    if x > (a + 1) / (a + b + 2):  # converges faster on the other side
+        return 1 - betainc(b, a, 1 - x)
+    c, d = 1., 1 - (a + b) * x / (a + 1)
+    d = 1 / (d if abs(d) > 1e-300 else 1e-300)
+    f = d
+    for m in range(1, 300):
+        for num in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                    -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1 + num * d
+            d = 1 / (d if abs(d) > 1e-300 else 1e-300)
+            c = 1 + num / c
+            c = c if abs(c) > 1e-300 else 1e-300
+            f *= c * d
+        if abs(c * d - 1) < 1e-12:
+            break
+    return front * f / a
+
+
+def import_time(module: str, repeats=5) -> tuple[float, list[tuple[str, float]]]:
+    """
+    Parameters:
+        module: str
+        repeats: int, fresh interpreters, the fastest one counts
+    Imports module with python -X importtime and returns its cumulative import time in seconds and every module it
+    imported with its own import time, slowest first.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # so the package imports without installing
+    best, modules = None, []
+    for _ in range(repeats):
+        run = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=root,
+                             capture_output=True, text=True, check=True)
+        times = []
+        for line in run.stderr.splitlines():  # import time: self [us] | cumulative | imported package
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            own, cumulative, name = line[len("import time:"):].split("|")
+            times.append((name.strip(), int(own) / 1e6, int(cumulative) / 1e6))
+        total = next(cumulative for name, _, cumulative in times if name == module)
+        if best is None or total < best:
+            best, modules = total, sorted(((name, own) for name, own, _ in times), key=lambda x: -x[1])
+    return best, modules
+
+
+def score_map_drift(setup: Setup, vectorize: bool, episodes: int, rng: Random) -> int:
+    """
+    Parameters:
+        setup: Setup
+        vectorize: bool, check the numpy or the pure python score map of Dense
+        episodes: int
+        rng: random.Random, decides the budgets and how many turns pass between checks
+    Plays Dense against random fleets with expired or tight budgets, so shot fields pile up without being discounted,
+    then brings the score map up to date with get_shot and compares it with a freshly built one.
+    Returns the largest difference of a field.
+    """
+    dense, opponent = setup.dense(vectorize=vectorize), setup.random()
+    dense.initialize(opponent)
+    worst = 0
+    for _ in range(episodes):
+        opponent.placement()
+        while not opponent.game.game_over:
+            for _ in range(rng.randint(1, 6)):  # several turns in a row, so more than one field is pending
+                if not opponent.game.game_over:
+                    dense.shoot_within(opponent, rng.choice((0, 0, 2e-5, 1e-4)))
+            if dense.game.game_forfeit:
+                raise RuntimeError("Dense forfeit the game, see its error log.")
+            if dense.tracked_hits or dense.stale or opponent.game.game_over:
+                continue  # these maps are rebuilt, not discounted
+            dense.get_shot(opponent)
+            fresh = dense.create_score_map(opponent)
+            worst = max(worst, max(abs(int(a) - int(b)) for a, b in zip(dense.distribution, fresh)))
+        dense.reset()
+        opponent.game.reset()
+    return worst
+
+
+SAMPLER_CASES = (  # (length, height, ships, use_spacer, hits, misses, sunk), small enough to enumerate
+    (4, 4, [2, 2, 3], True, [5], [6], []),  # crowded, single ships can't get past each other
+    (5, 5, [2, 3, 3], True, [12], [7], []),
+    (6, 6, [2, 2, 3, 4], True, [8], [14, 21], []),
+    (5, 5, [2, 3, 4], False, [6, 7, 12, 17], [], []),  # hits that can be split between ships in several ways
+    (5, 5, [2, 3, 3], False, [6, 7, 8], [9], [(8, 3)]),
+)
+
+
+def exact_marginals(sampler: LayoutSampler) -> list[float]:
+    """
+    Parameters:
+        sampler: LayoutSampler
+    Enumerates every layout consistent with the observations of sampler and returns the share of layouts with a ship
+    afloat on each field, the quantity LayoutSampler.sample estimates.
+    """
+    counts, total = [0] * sampler.size, 0
+    state = [0] * len(sampler.ships)
+
+    def place(k: int, blocked: int, covered: int):
+        nonlocal total
+        if k == len(state):
+            if not sampler.hits & ~covered:
+                total += 1
+                for j, i in enumerate(state):
+                    if sampler.afloat[j]:
+                        for x in sampler.tables[j].placement(i):
+                            counts[x] += 1
+            return
+        for i in sampler.domains[k]:
+            if not sampler.masks[k][i] & blocked:
+                state[k] = i
+                place(k + 1, blocked | sampler.blocks[k][i], covered | sampler.masks[k][i])
+
+    place(0, 0, 0)
+    return [c / total for c in counts]
+
+
+def sampler_error(case: tuple, sweeps: int, seed: int) -> float:
+    """
+    Parameters:
+        case: tuple, see SAMPLER_CASES
+        sweeps: int
+        seed: int
+    Returns the largest difference between the sampled and the exact expectation of a ship on a field.
+    """
+    length, height, ships, spacer, hits, misses, sunk = case
+    settings = length, height, ships, spacer, sum(1 << x for x in hits), sum(1 << x for x in misses), sunk
+    sampler = LayoutSampler(*settings, Random(seed))
+    counts, n = sampler.sample(sweeps, 50)
+    exact = exact_marginals(LayoutSampler(*settings, Random(seed)))
+    return max(abs(c / n - e) for c, e in zip(counts, exact))
+
+
+def compare(old: dict, new: dict, alpha=.01, threshold=.05) -> list[str]:
+    """
+    Parameters:
+        old: dict, baseline as written by Bench.dump
+        new: dict, new run
+        alpha: float, significance level
+        threshold: float, relative slowdown below which changes are ignored
+    Prints the change of every benchmark present in both and returns the names of significant regressions.
+    """
+    regressions = []
+    for name, a in old["results"].items():
+        b = new["results"].get(name)
+        if b is None:
+            continue
+        t, p = welch(a, b)
+        change = b["mean"] / a["mean"] - 1 if a["mean"] else 0.
+        flag = ""
+        if p < alpha and abs(change) > threshold:
+            flag = "REGRESSION" if change > 0 else "improvement"
+            if change > 0:
+                regressions.append(name)
+        print(f"{name:<48} {change:+8.2%}  p={p:.4f}  {flag}")
+    return regressions
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = ArgumentParser(prog="python -m battleships.bench", description="Benchmarks for battleships.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmarks and save a baseline")
+    run.add_argument("-o", "--output", default="bench.json", help="file the baseline is written to")
+    run.add_argument("--sizes", type=int, nargs="+", default=[10, 12], help="board side lengths")
+    run.add_argument("--spacer", choices=("off", "on", "both"), default="both")
+    run.add_argument("--ships", type=int, nargs="+", default=[5, 4, 3, 3, 2])
+    run.add_argument("--players", nargs="+", choices=CHOICES, default=list(PLAYERS))
+    run.add_argument("--repeats", type=int, default=5, help="samples per benchmark")
+    run.add_argument("-n", type=int, default=200, help="boards per micro benchmark sample")
+    run.add_argument("--episodes", type=int, default=50, help="games per macro benchmark sample")
+    run.add_argument("--bitboard", action="store_true", help="use the bitboard engine")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--only", choices=("micro", "macro"), help="run only one kind of benchmark")
+
+    lat = commands.add_parser("latency", help="report turn latency percentiles of the players")
+    lat.add_argument("-o", "--output", help="file the percentiles are written to")
+    lat.add_argument("--budget", type=float, help="seconds per shot, unlimited if not given")
+    lat.add_argument("--sizes", type=int, nargs="+", default=[10, 12], help="board side lengths")
+    lat.add_argument("--spacer", choices=("off", "on", "both"), default="both")
+    lat.add_argument("--ships", type=int, nargs="+", default=[5, 4, 3, 3, 2])
+    lat.add_argument("--players", nargs="+", choices=CHOICES, default=list(PLAYERS))
+    lat.add_argument("--episodes", type=int, default=200, help="games per player and setting")
+    lat.add_argument("--bitboard", action="store_true", help="use the bitboard engine")
+    lat.add_argument("--seed", type=int, default=0)
+
+    imp = commands.add_parser("imports", help="check the import time of a module against a budget")
+    imp.add_argument("--module", default="battleships.player.hunter")
+    imp.add_argument("--budget", type=float, default=50, help="milliseconds")
+    imp.add_argument("--repeats", type=int, default=5, help="fresh interpreters, the fastest one counts")
+    imp.add_argument("--forbid", nargs="*", default=["numpy", "matplotlib", "colorama"],
+                     help="modules that may not be imported along with it")
+
+    drift = commands.add_parser("scoremap", help="check Dense's score map under expired time budgets")
+    drift.add_argument("--sizes", type=int, nargs="+", default=[10, 12], help="board side lengths")
+    drift.add_argument("--spacer", choices=("off", "on", "both"), default="both")
+    drift.add_argument("--ships", type=int, nargs="+", default=[5, 4, 3, 3, 2])
+    drift.add_argument("--episodes", type=int, default=20, help="games per setting")
+    drift.add_argument("--seed", type=int, default=0)
+
+    smp = commands.add_parser("sampler", help="check the MonteCarlo layout sampler against exact enumeration")
+    smp.add_argument("--sweeps", type=int, default=10000, help="sweeps per chain")
+    smp.add_argument("--seeds", type=int, default=3, help="chains per case, each from its own seed")
+    smp.add_argument("--tolerance", type=float, default=.04, help="largest allowed error of a field")
+
+    cmp = commands.add_parser("compare", help="compare a new run against a baseline")
+    cmp.add_argument("baseline")
+    cmp.add_argument("new")
+    cmp.add_argument("--alpha", type=float, default=.01, help="significance level of Welch's t-test")
+    cmp.add_argument("--threshold", type=float, default=.05, help="ignore relative changes below this")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        spacers = {"off": [False], "on": [True], "both": [False, True]}[args.spacer]
+        bench = Bench(args.sizes, spacers, args.ships, args.repeats, args.n, args.episodes, args.bitboard, args.seed,
+                      args.players)
+        if args.only != "macro":
+            bench.micro()
+        if args.only != "micro":
+            bench.macro()
+        bench.dump(args.output, argv)
+        return 0
+    if args.command == "latency":
+        spacers = {"off": [False], "on": [True], "both": [False, True]}[args.spacer]
+        bench = Bench(args.sizes, spacers, args.ships, episodes=args.episodes, bitboard=args.bitboard, seed=args.seed,
+                      players=args.players)
+        print(bench.latency(args.budget).report())
+        if args.output is not None:
+            bench.dump(args.output, argv)
+        return 0
+    if args.command == "imports":
+        seconds, modules = import_time(args.module, args.repeats)
+        print(f"import {args.module}: {format_time(seconds)} (budget {args.budget:g} ms)")
+        for name, own in modules[:5]:
+            print(f"    {name:<44} {format_time(own)}")
+        forbidden = [name for name, _ in modules if name.split(".")[0] in args.forbid]
+        if forbidden:
+            print(f"Imported eagerly: {', '.join(forbidden[:10])}")
+        return 1 if forbidden or seconds * 1e3 > args.budget else 0
+    if args.command == "scoremap":
+        spacers = {"off": [False], "on": [True], "both": [False, True]}[args.spacer]
+        rng, failed = Random(args.seed), False
+        for size, spacer, vectorize in product(args.sizes, spacers, (False, True)):
+            setup = Setup((size, size), spacer, list(args.ships), seed=args.seed)
+            worst = score_map_drift(setup, vectorize, args.episodes, rng)
+            failed |= bool(worst)
+            tag = f"{size}x{size}{' spacer' if spacer else ''}{' numpy' if vectorize else ''}"
+            print(f"Dense score map [{tag}]: {'ok' if not worst else f'off by up to {worst}'}")
+        return 1 if failed else 0
+    if args.command == "sampler":
+        failed = False
+        for case in SAMPLER_CASES:
+            error = max(sampler_error(case, args.sweeps, seed) for seed in range(args.seeds))
+            failed |= error > args.tolerance
+            length, height, ships, spacer, hits, misses, sunk = case
+            print(f"{length}x{height} {ships}{' spacer' if spacer else ''} hits {hits} misses {misses} sunk {sunk}: "
+                  f"max error {error:.4f}{'' if error <= args.tolerance else ' FAILED'}")
+        return 1 if failed else 0
+    with open(args.baseline) as file:
+        old = json.load(file)
+    with open(args.new) as file:
+        new = json.load(file)
+    regressions = compare(old, new, args.alpha, args.threshold)
+    print(f"\n{len(regressions)} significant regression(s).")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,18 +1,21 @@
 
 from string import ascii_uppercase, ascii_lowercase, punctuation
-from random import randint
+import random
 
 from battleships.core.error import FieldSizeError, ShotError, LengthError, InvalidPositionError, ShipLengthError
+from battleships.core.placement import Placements, Pool, placement_index
 
 
 class BaseGame:
-    def __init__(self, size: tuple[int, int], use_spacer: bool = False):
+    def __init__(self, size: tuple[int, int], use_spacer: bool = False, bitboard: bool = False, rng=None):
         if type(self) != BaseGame:
             raise AttributeError("BaseGame should not be inherited and only passed as an instance.")
         """
         Parameters:
             size: tuple (x, y) or int. Constructs a field with size x, y or x, x if int is given
             use_spacer: bool. Set True if ships may not touch during placing
+            bitboard: bool. Set True to store board, hits and misses as integer bitmasks instead of lists
+            rng: random.Random. Source of random placements, the global random module if not given
         """
         if isinstance(size, tuple):
             if len(size) == 1:
@@ -24,10 +27,19 @@ class BaseGame:
         self.__length = size[0]
         self.__height = size[1]
         self.__use_spacer = bool(use_spacer)
+        self.__bitboard = bool(bitboard)
+        self.__rng = rng if rng is not None else random
         self.__test_size()
         self.__size = self.__height * self.__length  # calculate length
-        self.__board = [0] * self.__size
-        self.__shots = [0] * self.__size
+        self.__board = bytearray(self.__size)  # 1 for every field of a ship
+        self.__shots = bytearray(self.__size)  # 1 for every hit, 2 for every miss
+        self.__board_view = memoryview(self.__board).toreadonly()  # zero-copy, follow the game across resets
+        self.__shots_view = memoryview(self.__shots).toreadonly()
+        # bitboard engine, bit n of each mask corresponds to field n, board and shots are kept alongside for the views
+        self.__occupied = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__blocked = 0  # fields new ships may not use, occupied ones and with use_spacer their neighbors as well
         self.__letters = (ascii_uppercase + ascii_lowercase + punctuation)[:self.__length]
 
         # flags
@@ -38,11 +50,17 @@ class BaseGame:
         self.__length_ship_sunk = 0
 
         # internal variables
-        self.__lines = self.get_lines()
-        self.__columns = self.get_columns()
+        self.__placements = placement_index(self.__length, self.__height)  # shared with all games of this size
         self.__ships = []
+        self.__ship_masks = []
         self.__alive = []
-        self.__calculated = {}
+        self.__cell_ship = {}  # field -> index of the ship on it
+        self.__remaining = []  # fields of each ship that have not been hit yet
+        self.__sunken = 0  # number of sunken ships
+
+        if self.__bitboard:  # swap in the mask based functions, the list based ones are the default
+            self.shoot = self.__shoot_mask
+            self.set_ship = self.__set_ship_mask
 
     def get_lines(self) -> list[list[int]]:
         lines = []
@@ -63,11 +81,44 @@ class BaseGame:
 
     @property
     def board(self) -> list[int]:
-        return [*self.__board]  # self.__board.copy()
+        return [*self.__board]  # a copy the caller may modify, see board_view
 
     @property
     def shots(self) -> list[int]:
-        return [*self.__shots]  # self.__shots.copy()
+        return [*self.__shots]  # a copy the caller may modify, see shots_view
+
+    @property
+    def board_view(self) -> memoryview:
+        """
+        Read-only view of the board, 1 for every field of a ship. Nothing is copied, the view always shows the
+        current state of the game, including after a reset. Copy it to keep a snapshot.
+        """
+        return self.__board_view
+
+    @property
+    def shots_view(self) -> memoryview:
+        """
+        Read-only view of the shots, 1 for every hit, 2 for every miss. Nothing is copied, the view always shows the
+        current state of the game, including after a reset. Copy it to keep a snapshot.
+        numpy reads it without copying as well: np.frombuffer(game.shots_view, dtype=np.uint8)
+        """
+        return self.__shots_view
+
+    def is_shot(self, position: int) -> bool:
+        """
+        Parameters:
+            position: int
+        Checks if position was shot at, without copying the shots.
+        """
+        return bool(self.__shots[position])
+
+    def is_hit(self, position: int) -> bool:
+        """
+        Parameters:
+            position: int
+        Checks if a shot at position hit a ship.
+        """
+        return self.__shots[position] == 1
 
     @property
     def ships(self) -> list[list[int]]:
@@ -109,58 +160,60 @@ class BaseGame:
     def letters(self) -> str:
         return self.__letters
 
+    @property
+    def bitboard(self) -> bool:
+        return self.__bitboard
+
+    @property
+    def use_spacer(self) -> bool:
+        return self.__use_spacer
+
+    @property
+    def rng(self):
+        return self.__rng
+
     def __test_size(self):  # __ to disable direct access from outside -> you should not use these
         if self.__length > 84:  # self.__letters is max 84 chars long
             raise FieldSizeError(self.__length)
 
-    def __check_surroundings(self, position) -> bool:
-        # used to check the surroundings of a spot, used for use_spacer
-        line = None
-        for element in self.__lines:
-            if position in element:
-                line = element  # line in which position sits
-                break
-        positions = []
-        for element in (-1, 1):
-            if position + element in line:
-                positions.append(position + element)
-            # check if in line, wrap around is avoided
-        for element in (-self.__length, self.__length):
-            if position + element in list(range(self.__size)):
-                positions.append(position + element)
-                # prevent overflow from top or bottom
-        cnt = 0
-        for element in positions:
-            if not self.__board[element]:
-                cnt += 1  # count if all spaces are suitable
-        if cnt == len(positions):  # return result
-            return True
-        return False
-
-    def __ships_sunken(self):
-        """
-        Checks if all ships in self.ships are sunken.
+    def __ships_sunken(self, position: int):
+        """
+        Parameters:
+            position: int
+        Checks if the shot at position sunk a ship, only the ship at position can be affected.
+        Each ship keeps a counter of fields not yet hit, a ship is sunken once it reaches zero.
         Sets self.__game_over True if all ships have been sunken.
         Protected, flags should not be set from the outside.
         """
         self.__ship_sunk = False
         self.__length_ship_sunk = 0
         if self.__last_shot:  # don't bother calculating if something was sunk if nothing was hit with the last shot
-            cnt = 0
-            for i, ship in enumerate(self.__ships):
-                if not self.__alive[i]:  # don't set the flag twice
-                    if all(map(self.__extract, ship)):  # if every position has a non-zero value its been sunken
-                        self.__alive[i] = 1
-                        self.__ship_sunk = True
-                        self.__length_ship_sunk = len(ship)
-                        cnt += 1
-                else:
-                    cnt += 1
-            if cnt == len(self.__ships):
-                self.__game_over = True
-
-    def __extract(self, x: int) -> int:
-        return self.__shots[x]
+            i = self.__cell_ship[position]  # index of the ship that was hit
+            self.__remaining[i] -= 1
+            if not self.__remaining[i]:  # every position has been hit, it's been sunken
+                self.__sink(i)
+
+    def __ships_sunken_mask(self, position: int):
+        """
+        Bitboard version of self.__ships_sunken.
+        A ship is sunken if all of its bits are set in self.__hits.
+        """
+        self.__ship_sunk = False
+        self.__length_ship_sunk = 0
+        if self.__last_shot:
+            i = self.__cell_ship[position]
+            mask = self.__ship_masks[i]
+            if self.__hits & mask == mask:  # one AND and compare
+                self.__sink(i)
+
+    def __sink(self, i: int):
+        # marks ship i as sunken, sets the flags and game_over once all ships are down
+        self.__alive[i] = 1
+        self.__ship_sunk = True
+        self.__length_ship_sunk = len(self.__ships[i])
+        self.__sunken += 1
+        if self.__sunken == len(self.__ships):
+            self.__game_over = True
 
     def calculate_spot_combinations(self, size: int, spot: int) -> list[list[int]]:
         """
@@ -170,26 +223,7 @@ class BaseGame:
         Calculates all combinations for ship of length (size) through a single field (spot) on the board.
         Returns and empty list if board is too small to account for a ship of the given size.
         """
-        combinations = []
-        line = None  # get the line the spot is on
-        for li in self.__lines:
-            if spot in li:
-                line = set(li)
-
-        for i in range(1 - size, 1):
-            shift = [spot + x + i for x in range(size)]  # progressively increment all values
-            if min(shift) >= 0 and max(shift) < self.__size and set(shift).issubset(line):  # in-bounds and in line
-                shift.sort()
-                combinations.append(shift)
-
-        for i in range(1 - size, 1):
-            shift = [spot + self.__length * x + self.__length * i for x in range(size)]
-            if min(shift) >= 0 and max(shift) < self.__size:
-                shift.sort()
-                combinations.append(shift)
-
-        combinations.sort()
-        return combinations
+        return [*self.__placements.get(size).through(spot)]  # precomputed per board geometry, see core.placement
 
     def calculate_combinations(self, size: int) -> list[list[int]]:
         """
@@ -198,46 +232,22 @@ class BaseGame:
         Calculates all possible combinations for ship of length (size).
         Returns an empty list if board is too small to account for a ship of the given size.
         """
+        return self.__table(size).as_lists()  # copy of the list, inner lists are shared
 
-        if size in self.__calculated:
-            return self.__calculated[size].copy()
-        # ships may have the same size or the function may be called again
-        # saving already computed combinations for a given size saves a huge amount of computation that would otherwise
-        # be performed multiple times
-
+    def __table(self, size: int) -> Placements:
+        # placement table of ships of length (size), raises ShipLengthError if they don't fit on the board
         if size > self.__length and size > self.__height:
             raise ShipLengthError(size, max(self.__height, self.__length), (self.__length, self.__height))
-        horizontal = list(range(size))  # initial starting point horizontal, i.e. [0, 1, 2]
-        vertical = [x * self.__length for x in range(size)]  # initial starting point vertical, i.e. [0, 4, 8]
-        combinations_hor = [horizontal]  # init for all horizontal combinations
-        combinations_vert = [vertical]  # same for vertical
-
-        while max(horizontal) < self.__size - 1:
-            horizontal = [x + 1 for x in horizontal]  # increment all by one
-            combinations_hor.append(horizontal)
-            # check if new list is subset of one line, if not wrap around occurs:
-            # 0 0 1 1
-            # 1 0 0 0
-            # 0 0 0 0
-            # check with lines to eliminate those cases
-        while max(vertical) < self.__size - 1:
-            vertical = [x + 1 for x in vertical]
-            combinations_vert.append(vertical)
-            # no need to check for wrap around, if one wraps all wrap
-            # 0 0 1    0 0 0
-            # 0 0 1 -> 1 0 0
-            # 0 0 0    1 0 0
-        combinations = combinations_hor + combinations_vert  # combine the two
-        c = []  # new combinations list
-        lines_columns = self.__lines + self.__columns  # all lines and columns
-        for element in combinations:
-            s = set(element)
-            for comb in lines_columns:
-                if s.issubset(comb):  # and element not in c:  # if combination is in all lines and columns append
-                    # todo check if necessary (and element not in c) -> probably not but not sure
-                    c.append(element)  # if not then there is wrap around, don't want that
-        self.__calculated.update({size: c})
-        return [*c]  # don't return a reference, but a copy
+        return self.__placements.get(size)
+
+    def get_placements(self, size: int) -> Placements:
+        """
+        Parameters:
+            size: int
+        Returns the process wide placement table for ships of length (size) on this board.
+        Combinations are generated once per board geometry and shared by all instances, see core.placement.
+        """
+        return self.__placements.get(size)
 
     def set_ship(self, ship: list):
         """
@@ -246,31 +256,47 @@ class BaseGame:
         Sets ship on self.__board if no obstructions are found.
         Raises InvalidPositionError if ship cannot be placed.
         """
+        self.__reserve(ship)
+        for element in ship:
+            self.__board[element] = 1  # make changes to board
+            self.__cell_ship[element] = len(self.__ships)  # map each field to the index of its ship
+        self.__ships.append(ship)
+        self.__remaining.append(len(ship))
+        self.__alive.append(0)
+
+    def __set_ship_mask(self, ship: list):
+        """
+        Bitboard version of set_ship.
+        """
+        mask = self.__reserve(ship)
+        for element in ship:
+            self.__board[element] = 1
+            self.__cell_ship[element] = len(self.__ships)
+        self.__ships.append(ship)
+        self.__ship_masks.append(mask)
+        self.__alive.append(0)
+        self.__occupied |= mask
+
+    def __reserve(self, ship: list) -> int:
+        """
+        Checks if ship is a valid combination and is not obstructed, then marks its fields as blocked.
+        With use_spacer the neighboring fields are blocked as well, so other ships may not touch it.
+        Returns the mask of ship.
+        Raises InvalidPositionError if ship cannot be placed.
+        """
         ship.sort()
-        if ship not in self.calculate_combinations(len(ship)):  # test if ship is a valid combination
+        if self.__table(len(ship)).find(ship) is None:  # test if ship is a valid combination, one dict lookup
             raise InvalidPositionError(len(ship), ship)
 
-        possibles = [0] * len(ship)  # keep track of non-obstructed fields
-        for i, element in enumerate(ship):
-            if not self.__board[element]:  # check if board position is free
-                possibles[i] = 1
-        if self.__use_spacer:
-            for i, element in enumerate(ship):
-                if not self.__check_surroundings(element):
-                    possibles[i] = 0  # check for surroundings if ships may not touch
-
-        if all(possibles):
-            self.__ships.append(ship)
-            self.__alive.append(0)
-            for element in ship:
-                self.__board[element] = 1  # make changes to board
-        else:
-            obstructed = []
-            for i, element in enumerate(possibles):
-                if not element:
-                    obstructed.append(ship[i])
+        mask, halo = 0, 0
+        halos = self.__placements.halos  # precomputed mask of each field and its neighbors
+        for element in ship:
+            mask |= 1 << element
+            halo |= halos[element]
+        if mask & self.__blocked:  # one test against occupied (and with use_spacer adjacent) fields
             raise InvalidPositionError(len(ship), ship)
-            # error handling, show obstructed spaces to user
+        self.__blocked |= halo if self.__use_spacer else mask
+        return mask
 
     def set_ships(self, ships: list[list]):
         """
@@ -287,19 +313,60 @@ class BaseGame:
              ships: list of ints, each element is the length of one ship
              [3, 2, 1] -> 1 of len 3, 1 of len 2, ...
         Randomly places len(ships) on the board.
+        Each ship is drawn uniformly from the placements still legal for it, which are tracked per length in a Pool,
+        so no placement is ever tried and rejected.
         """
+        tables = {size: self.__table(size) for size in set(ships)}
+        pools = {size: Pool(table) for size, table in tables.items()}
+        if self.__blocked:  # ships were set before
+            for pool in pools.values():
+                pool.block(self.__blocked)
+        left = {size: ships.count(size) for size in pools}  # ships of each length still to be placed
         for ship in ships:
-            combinations = self.calculate_combinations(ship)  # get possible combinations
-            while 1:
-                try:
-                    combination = combinations.pop(randint(0, len(combinations) - 1))  # pick one
-                    self.set_ship(combination)  # try it
-                    break  # worked
-                except InvalidPositionError:
-                    pass  # something in the way, try another one
-                except ValueError:
-                    raise RecursionError(f"Placing ship of length {ship} failed. Increase the field size or decrease "
-                                         "the number or length of ships.")
+            try:
+                i = pools[ship].sample(self.__rng)  # pick one
+            except ValueError:
+                raise RecursionError(f"Placing ship of length {ship} failed. Increase the field size or decrease "
+                                     "the number or length of ships.")
+            left[ship] -= 1
+            self.__place(ship, i)
+            for size, pool in pools.items():
+                if left[size]:  # pools of lengths that are done don't need to be updated
+                    pool.remove(tables[ship].conflicts(tables[size], self.__use_spacer)[i])
+
+    def set_placements(self, ships: list[int], placements: list[int]):
+        """
+        Parameters:
+            ships: list of ints, length of each ship
+            placements: list of ints, index of each ship's placement in its table, see get_placements
+        Sets a whole fleet by placement indices, e.g. a layout of util.layouts.LayoutLibrary.
+        Placements are not validated, they must come from a legal layout of this board.
+        """
+        for size, i in zip(ships, placements):
+            self.__place(size, i)
+
+    def __place(self, size: int, i: int):
+        """
+        Parameters:
+            size: int
+            i: int
+        Sets placement i of the ships of length (size) without validating it, only for placements known to be legal.
+        """
+        table = self.__placements.get(size)
+        ship = table.placement(i)
+        mask = table.masks[i]
+        self.__blocked |= table.halos[i] if self.__use_spacer else mask
+        n = len(self.__ships)
+        for element in ship:
+            self.__board[element] = 1
+            self.__cell_ship[element] = n
+        if self.__bitboard:
+            self.__ship_masks.append(mask)
+            self.__occupied |= mask
+        else:
+            self.__remaining.append(size)
+        self.__ships.append(ship)
+        self.__alive.append(0)
 
     def shoot(self, position: int):
         """
@@ -319,7 +386,26 @@ class BaseGame:
                 self.__last_shot = False  # set flag
         else:
             raise ShotError(position)  # already shot there
-        self.__ships_sunken()
+        self.__ships_sunken(position)
+
+    def __shoot_mask(self, position: int):
+        """
+        Bitboard version of shoot.
+        """
+        if not 0 <= position < self.__size:
+            raise IndexError(f"Position {position} is not on the board.")
+        bit = 1 << position
+        if (self.__hits | self.__misses) & bit:
+            raise ShotError(position)  # already shot there
+        if self.__occupied & bit:
+            self.__hits |= bit  # hit
+            self.__shots[position] = 1
+            self.__last_shot = True
+        else:
+            self.__misses |= bit  # miss
+            self.__shots[position] = 2
+            self.__last_shot = False
+        self.__ships_sunken_mask(position)
 
     def render(self, *args: bool or list):
         """
@@ -331,7 +417,7 @@ class BaseGame:
         Args[1] if 2 args are given.
         Args[1] has to be of length self.__size
         """
-        btp = self.__board if len(args) == 1 else self.__shots if len(args) == 0 else args[1]
+        btp = self.board if len(args) == 1 else self.shots if len(args) == 0 else args[1]
         if len(args) > 1:
             if len(args[1]) != self.__size:
                 raise LengthError(len(args[1]), "args", "BaseGame.render", self.__size)
@@ -351,23 +437,57 @@ class BaseGame:
     def forfeit(self):
         """
         Immediately forfeits the game.
-        Next self.ships_sunken call will return True.
+        All ships are marked as sunken and game_over is set.
         """
         self.__game_forfeit = True
         self.__last_shot = True
+        self.__ship_sunk = False
+        self.__length_ship_sunk = 0
         for i in range(len(self.__alive)):
             self.__alive[i] = 1
-        self.__ships_sunken()
+        self.__sunken = len(self.__ships)
+        self.__game_over = True
+
+    def instrument(self, timings):
+        """
+        Parameters:
+            timings: util.timing.Timings
+        Records the durations of shoot and of the sink check in timings, for the rest of this instance's lifetime.
+        """
+        self.shoot = timings.wrap(self.shoot, "BaseGame.shoot")
+        if self.__bitboard:
+            self.__ships_sunken_mask = timings.wrap(self.__ships_sunken_mask, "BaseGame sink check")
+        else:
+            self.__ships_sunken = timings.wrap(self.__ships_sunken, "BaseGame sink check")
+
+    def seed(self, key):
+        """
+        Parameters:
+            key: int, str or bytes
+        Seeds the random source of this instance, an instance still using the global random module gets its own.
+        """
+        if self.__rng is random:
+            self.__rng = random.Random()
+        self.__rng.seed(key)
 
     def reset(self):
         """
         Resets all by gameplay affected values to default.
         """
-        self.__board = [0] * self.__size
-        self.__shots = [0] * self.__size
+        self.__board[:] = bytes(self.__size)  # cleared in place, the views stay valid
+        self.__shots[:] = bytes(self.__size)
+        self.__occupied = 0
+        self.__hits = 0
+        self.__misses = 0
         self.__last_shot = False
         self.__ship_sunk = False
         self.__game_over = False
+        self.__game_forfeit = False
         self.__length_ship_sunk = 0
+        self.__blocked = 0
         self.__ships = []
+        self.__ship_masks = []
         self.__alive = []
+        self.__cell_ship = {}  # field -> index of the ship on it
+        self.__remaining = []  # fields of each ship that have not been hit yet
+        self.__sunken = 0  # number of sunken ships
@@ -0,0 +1,239 @@
+from array import array
+
+
+class Placements:
+    """
+    All placements of a ship of length (ship) on a board of size (length, height).
+    Placements are stored flat in self.cells, placement n occupies self.cells[n * ship:(n + 1) * ship].
+    The order is the one BaseGame.calculate_combinations has always used: all horizontal placements followed by all
+    vertical ones, each ordered by their first field.
+    Instances are shared between all BaseGame instances of the same geometry and must not be modified.
+    """
+    def __init__(self, length: int, height: int, ship: int, halos: list[int]):
+        self.length = length
+        self.height = height
+        self.ship = ship
+        self.size = length * height
+        self.cells = array("I")  # flat list of fields, ship entries per placement
+        self.masks = []  # one bitmask per placement, bit n corresponds to field n
+
+        if 0 < ship <= length:
+            for line in range(height):
+                for start in range(line * length, line * length + length - ship + 1):
+                    self.cells.extend(range(start, start + ship))  # horizontal, no wrap around possible
+        if 1 < ship <= height:  # a ship of length 1 is the same horizontally and vertically, don't count it twice
+            for start in range((height - ship + 1) * length):
+                self.cells.extend(range(start, start + ship * length, length))  # vertical
+        self.count = len(self.cells) // ship if ship > 0 else 0
+        self.ids = list(range(self.count))  # 0 .. count - 1, copied by Pool
+
+        for i in range(self.count):
+            mask = 0
+            for x in self.cells[i * ship:(i + 1) * ship]:
+                mask |= 1 << x
+            self.masks.append(mask)
+
+        self.__cell_halos = halos
+        self.__halos = None
+        self.__lists = None
+        self.__by_cell = None
+        self.__through = None
+        self.__ids = None
+        self.__conflicts = {}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def placement(self, i: int) -> list[int]:
+        """
+        Parameters:
+            i: int
+        Returns the fields of placement i.
+        """
+        return self.cells[i * self.ship:(i + 1) * self.ship].tolist()
+
+    def as_lists(self) -> list[list[int]]:
+        """
+        Returns all placements as a list of lists.
+        The outer list is a copy, the inner lists are shared and should not be modified.
+        """
+        if self.__lists is None:  # only built on first use, not every caller needs lists
+            self.__lists = [self.placement(i) for i in range(self.count)]
+        return [*self.__lists]
+
+    def find(self, ship: list[int]) -> int or None:
+        """
+        Parameters:
+            ship: list[int], sorted fields
+        Returns the index of the placement occupying exactly the fields of ship, None if there is none.
+        """
+        if self.__ids is None:
+            self.__ids = {tuple(self.cells[i * self.ship:(i + 1) * self.ship]): i for i in range(self.count)}
+        return self.__ids.get(tuple(ship))
+
+    @property
+    def by_cell(self) -> list[array]:
+        """
+        Inverted index, by_cell[field] holds the indices of all placements covering field.
+        """
+        if self.__by_cell is None:
+            by_cell = [array("I") for _ in range(self.size)]
+            for i, x in enumerate(self.cells):
+                by_cell[x].append(i // self.ship)
+            self.__by_cell = by_cell
+        return self.__by_cell
+
+    @property
+    def halos(self) -> list[int]:
+        """
+        One mask per placement, the placement and all fields directly next to it (not diagonally).
+        Used for use_spacer, a ship may not be placed on any field in the halo of another ship.
+        """
+        if self.__halos is None:  # only needed with use_spacer
+            halos = []
+            for i in range(self.count):
+                halo = 0
+                for x in self.cells[i * self.ship:(i + 1) * self.ship]:
+                    halo |= self.__cell_halos[x]
+                halos.append(halo)
+            self.__halos = halos
+        return self.__halos
+
+    def conflicts(self, other: "Placements", spacer: bool) -> list[list[int]]:
+        """
+        Parameters:
+            other: Placements, of the same board
+            spacer: bool, ships may not touch
+        Returns for each placement of this table the indices of the placements of other that are illegal once it is set.
+        Built on first call per (other, spacer), each list holds every index only once.
+        """
+        key = other.ship, spacer
+        if key not in self.__conflicts:
+            blocked = self.halos if spacer else self.masks
+            conflicts = []
+            for mask in blocked:
+                ids = set()
+                while mask:
+                    low = mask & -mask
+                    mask ^= low
+                    ids.update(other.by_cell[low.bit_length() - 1])
+                conflicts.append(sorted(ids))
+            self.__conflicts[key] = conflicts
+        return self.__conflicts[key]
+
+    def through(self, cell: int) -> list[list[int]]:
+        """
+        Parameters:
+            cell: int
+        Returns all placements covering field (cell), sorted.
+        The table for all fields is built on first call, the returned list is shared and should not be modified.
+        """
+        if self.__through is None:
+            self.as_lists()  # make sure self.__lists exists
+            self.__through = [sorted(self.__lists[i] for i in ids) for ids in self.by_cell]
+        return self.__through[cell]
+
+
+class Pool:
+    """
+    The placements of one table that are still legal on a board, for sampling without rejection.
+    Legal placements are kept in the first self.live entries of self.ids, a placement that becomes illegal is replaced
+    by the last legal one.
+    """
+    def __init__(self, table: Placements):
+        self.by_cell = table.by_cell
+        self.ids = table.ids.copy()
+        self.where = table.ids.copy()  # where[placement] -> position of placement in self.ids
+        self.live = table.count  # number of legal placements
+
+    def block(self, mask: int):
+        """
+        Parameters:
+            mask: int
+        Removes every placement covering a field of mask.
+        """
+        while mask:
+            low = mask & -mask  # lowest set bit
+            mask ^= low
+            self.remove(self.by_cell[low.bit_length() - 1])
+
+    def remove(self, placements):
+        """
+        Parameters:
+            placements: iterable of placement indices
+        Removes placements, indices that were removed before are skipped. Costs O(len(placements)).
+        """
+        ids, where, live = self.ids, self.where, self.live
+        for p in placements:
+            i = where[p]
+            if i < live:  # still legal, the last legal one takes its position
+                live -= 1
+                q = ids[live]
+                ids[i] = q
+                where[q] = i
+                where[p] = live  # >= live from now on, marks p as removed
+        self.live = live
+
+    def sample(self, rng) -> int:
+        """
+        Parameters:
+            rng: random.Random or the random module
+        Returns a uniformly chosen legal placement, raises ValueError if there is none.
+        """
+        return self.ids[rng.randint(0, self.live - 1)]
+
+
+class PlacementIndex:
+    """
+    Placements of every ship length for one board geometry, built on first request per length.
+    Use placement_index() to get the instance shared by the whole process.
+    """
+    def __init__(self, length: int, height: int):
+        self.length = length
+        self.height = height
+        self.size = length * height
+        self.neighbors = []  # neighbors[field] -> fields directly next to it, ordered left, right, up, down
+        self.halos = []  # halos[field] -> mask of field and its neighbors
+        for x in range(self.size):
+            neighbors = []
+            if x % length:
+                neighbors.append(x - 1)
+            if x % length < length - 1:
+                neighbors.append(x + 1)
+            if x >= length:
+                neighbors.append(x - length)
+            if x + length < self.size:
+                neighbors.append(x + length)
+            halo = 1 << x
+            for n in neighbors:
+                halo |= 1 << n
+            self.neighbors.append(tuple(neighbors))
+            self.halos.append(halo)
+        self.__tables = {}
+
+    def get(self, ship: int) -> Placements:
+        """
+        Parameters:
+            ship: int
+        Returns the Placements of ship length (ship).
+        """
+        table = self.__tables.get(ship)
+        if table is None:
+            table = self.__tables[ship] = Placements(self.length, self.height, ship, self.halos)
+        return table
+
+
+_indices = {}  # (length, height) -> PlacementIndex, shared by all games and players of a process
+
+
+def placement_index(length: int, height: int) -> PlacementIndex:
+    """
+    Parameters:
+        length: int
+        height: int
+    Returns the PlacementIndex for a board of size (length, height), creating it if necessary.
+    """
+    index = _indices.get((length, height))
+    if index is None:
+        index = _indices[(length, height)] = PlacementIndex(length, height)
+    return index
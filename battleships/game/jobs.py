@@ -0,0 +1,108 @@
+from battleships.util.selector import Selector
+from battleships.util.stats import GameStats
+from battleships.util.store import ResultStore
+from battleships.util.timing import Timings
+from battleships.util.layouts import LayoutLibrary
+from battleships.loop.mploop import MPLoop
+from battleships.loop.batchloop import BatchLoop
+
+
+class Job(Selector):
+    """
+    Picklable description of a chunk of games between two players, sent to pool workers instead of the whole MPGame.
+    Holds nothing but the game settings, the chunk id and the number of episodes.
+    """
+    def __init__(self, n1: str, n2: str, size: tuple[int, int], use_spacer: bool, ships: list[int],
+                 bitboard=False, batch=False, stream=False, store=None, seed=None, timings=False, layouts=None,
+                 budget=None):
+        super().__init__()
+        self.n1, self.n2 = n1, n2
+        self.size = size
+        self.use_spacer = use_spacer
+        self.ships = ships
+        self.bitboard = bitboard
+        self.batch = batch
+        self.stream = stream
+        self.store = store  # directory of a ResultStore, results are written there instead of returned
+        self.seed = seed  # int, episodes are seeded from (seed, number of the episode within the run) if given
+        self.timings = timings  # time the phases of MPLoop, run returns (result, Timings) then
+        self.layouts = layouts  # (directory, mode) of a LayoutLibrary fleets are taken from, not used by BatchLoop
+        self.budget = budget  # seconds per shot, turn latencies are returned like timings, not used by BatchLoop
+        self.id = 0
+        self.start = 0  # number of the first episode of the chunk within the run
+        self.episodes = 0
+
+    def split(self, episodes: int, chunk: int) -> list["Job"]:
+        """
+        Parameters:
+            episodes: int
+            chunk: int
+        Splits episodes into jobs of at most chunk episodes each, the last one takes the remainder.
+        """
+        jobs = []
+        for i, start in enumerate(range(0, episodes, chunk)):
+            job = Job(self.n1, self.n2, self.size, self.use_spacer, self.ships, self.bitboard, self.batch, self.stream,
+                      self.store, self.seed, self.timings, self.layouts, self.budget)
+            job.id = i
+            job.start = start
+            job.episodes = min(chunk, episodes - start)
+            jobs.append(job)
+        return jobs
+
+    @property
+    def key(self) -> tuple:
+        # jobs with the same key can share player instances, whatever the opponent
+        return tuple(self.size), bool(self.use_spacer), tuple(sorted(self.ships)), self.bitboard
+
+    def player(self, seat: int, selector: str):
+        # player of seat 0 or 1 from the cache of this process, reused by every chunk and matchup it plays
+        key = self.key, seat, selector
+        if key not in _players:
+            _players[key] = self.get_player(selector, self.id)
+        return _players[key]
+
+    def get_player(self, selector, id_=0):
+        return {  # only the requested player is constructed
+            "Random": self.random,
+            "Hunter": self.hunter,
+            "Dense": self.dense,
+            "MonteCarlo": self.montecarlo,
+        }[selector](id_)
+
+    def library(self) -> LayoutLibrary or None:
+        if self.layouts is None:
+            return None
+        path, mode = self.layouts
+        return LayoutLibrary(path, self.size, self.ships, self.use_spacer, mode)
+
+    def run(self):
+        """
+        Plays the chunk and returns the result tuple of MPLoop.game_loop, a GameStats summary if stream is set or the
+        number of written games if store is set.
+        With timings or budget set a tuple of that result and the Timings of the chunk is returned, batched chunks
+        aren't timed.
+        """
+        size = self.size[0] * self.size[-1]
+        stats = GameStats(size) if self.stream else None
+        store = ResultStore(self.store, size, self.ships) if self.store is not None else None
+        timings = Timings() if self.timings or self.budget is not None else None
+        if self.batch:  # vectorized games, no player instances needed
+            seed = None if self.seed is None else (self.seed, self.start)  # own numpy stream for every chunk
+            result = BatchLoop(self.n1, self.n2, self.size, self.use_spacer, self.ships, self.episodes, seed=seed,
+                               stats=stats, store=store).game_loop()
+        else:
+            if self.timings:  # instrumented players stay wrapped, so they are not shared with other chunks
+                players = self.get_player(self.n1, self.id), self.get_player(self.n2, self.id)
+            else:
+                players = self.player(0, self.n1), self.player(1, self.n2)
+            result = MPLoop(*players, self.episodes, stats, store, self.seed,
+                            timings=timings if self.timings else None, layouts=self.library(), start=self.start,
+                            budget=self.budget, latencies=timings).game_loop()
+        return (result, timings) if timings is not None else result
+
+
+_players = {}  # (Job.key, seat, name) -> player, per worker process, reused by every chunk the process plays
+
+
+def run_job(job: Job):  # module level, so only the job is pickled
+    return job.run()
@@ -10,20 +10,44 @@ import cProfile
 
 from battleships.util.selector import Selector
 from battleships.util.util import CalcUtil, JSONFlatEncoder, NoIndent
+from battleships.util.stats import GameStats
+from battleships.util.store import ResultStore
+from battleships.util.timing import Timings
+from battleships.util.layouts import LayoutLibrary
 from battleships.loop.mploop import MPLoop
+from battleships.loop.batchloop import BatchLoop
+from battleships.game.jobs import Job, run_job
 
 
 class MPGame(CalcUtil, Selector):
-    def __init__(self, size: tuple[int, int], use_spacer: bool, ships: list[int], episodes: int, proc=cpu_count()):
+    def __init__(self, size: tuple[int, int], use_spacer: bool, ships: list[int], episodes: int, proc=cpu_count(),
+                 bitboard=False, batch=False, stream=False, chunk=None, seed=None, timings=False, layouts=None,
+                 library=100000, budget=None):
         super().__init__()
         self.size = size
         self.use_spacer = use_spacer
+        self.bitboard = bitboard
+        self.batch = batch  # use BatchLoop, Random and Hunter only
+        self.stream = stream  # workers return a GameStats summary instead of every game
+        self.seed = seed  # int, makes runs reproducible independent of the number of processes, see replay()
+        self.instrumented = bool(timings)  # time the phases of every game
+        self.budget = budget  # seconds per shot, see GameUtil.shoot_within, turn latencies are kept in self.timings
+        self.timings = Timings() if timings or budget is not None else None  # merged timings of all workers
+        self.layouts = layouts  # "sequential" or "uniform", fleets are taken from a LayoutLibrary of that mode
+        self.library_size = library  # layouts generated for the library if it doesn't exist yet
         self.ships = ships
         self.processes = proc
-        self.eps = episodes // self.processes
-        self.write_to_disk = bool(episodes >= 1000000)
+        self.episodes = episodes  # all of them are played, work is handed out in chunks
+        if chunk is None and batch and seed is not None:  # batched games depend on the chunks, which mustn't depend
+            chunk = BatchLoop.batch  # on the number of processes
+        elif chunk is None:  # small enough that stragglers don't idle the other processes, large enough to be cheap
+            chunk = max(1, episodes // (self.processes * (4 if batch else 16)))
+        self.chunk = chunk
+        self.write_to_disk = bool(episodes >= 1000000) and not stream  # workers write binary records, see util.store
         # result lists
         self.path = os.path.abspath(pathlib.Path(__file__).parent.resolve())
+        self.results = os.path.join(self.path, "results")
+        self.layout_path = os.path.join(self.path, "layouts")
         self.shots_p1 = []
         self.config_p1 = []
         self.shots_p2 = []
@@ -32,6 +56,7 @@ class MPGame(CalcUtil, Selector):
         self.game_length = []
         self.ff_p1 = []
         self.ff_p2 = []
+        self.stats = GameStats(self.size[0] * self.size[-1])  # merged summaries if stream is set
         # time keeping
         self.start, self.end, self.processing_time = None, None, None
         # change these for other players
@@ -40,11 +65,22 @@ class MPGame(CalcUtil, Selector):
     def game_start(self):
         self.start = time()
         results = []
-        for i, result in enumerate(Pool(processes=self.processes).imap_unordered(self.loop, range(self.processes))):
-            if self.write_to_disk:
-                self.write_results(result, i)  # write to file to save memory
-            else:
-                results.append(result)  # multi-thread, append to results
+        jobs = self.job().split(self.episodes, self.chunk)
+        if self.write_to_disk:
+            self.store().clear()  # records of a previous run
+        if self.layouts is not None:
+            self.library().ensure(self.library_size)  # generated once, before the workers map it
+        with Pool(processes=self.processes) as pool:
+            for result in pool.imap_unordered(run_job, jobs):  # next chunk goes to the first idle process
+                if self.timings is not None:
+                    result, timings = result
+                    self.timings.merge(timings)
+                if self.stream:
+                    self.stats.merge(result)  # summaries are small, merge right away
+                elif not self.write_to_disk:  # else the worker wrote the games to disk, result is their number
+                    results.append(result)  # multi-thread, append to results
+            pool.close()
+            pool.join()
 
         self.end = time()
         if self.write_to_disk:
@@ -53,23 +89,33 @@ class MPGame(CalcUtil, Selector):
             for result in results:
                 self.concatenate(result)
         self.processing_time = time()
-        self.write_config(self.config_p2)
+        if self.stream or self.write_to_disk:
+            self.dump_config(self.stats.length.min, self.stats.length.max, self.stats.low, self.stats.high,
+                             {f'heatmap {self.n1}': self.stats.heatmap[0], f'heatmap {self.n2}': self.stats.heatmap[1]})
+        else:
+            self.write_config(self.config_p2)
+        if self.timings is not None:
+            self.timings.dump(os.path.join(self.path, "timings.json"))
         self.show_info()
 
+    def job(self) -> Job:  # picklable settings of this run, the instance itself is never sent to the workers
+        return Job(self.n1, self.n2, self.size, self.use_spacer, self.ships, self.bitboard, self.batch, self.stream,
+                   self.results if self.write_to_disk else None, self.seed, self.instrumented,
+                   (self.layout_path, self.layouts) if self.layouts is not None else None, self.budget)
+
+    def library(self) -> LayoutLibrary:
+        return LayoutLibrary(self.layout_path, self.size, self.ships, self.use_spacer, self.layouts)
+
+    def store(self) -> ResultStore:
+        return ResultStore(self.results, self.size[0] * self.size[-1], self.ships)
+
     def concatenate(self, result):
         for i, e in enumerate(result):  # append to lists
             [self.wins, self.shots_p1, self.shots_p2, self.game_length, self.config_p1, self.config_p2, self.ff_p1,
              self.ff_p2][i].extend(e)
 
-    def write_results(self, res, id_):
-        with open(self.path + f"\\results\\{id_}.json", "w+") as file:
-            json.dump(res, file)  # dump to process at later time
-
-    def parse_results(self):  # huge episode number might result in memory problems
-        for file in os.listdir(self.path + "\\results\\"):
-            with open(self.path + "\\results\\" + file) as outfile:
-                r = json.load(outfile)
-                self.concatenate(r)
+    def parse_results(self):  # summarised straight from the memory mapped records, nothing is loaded as a whole
+        self.stats = self.store().stats()
 
     def write_config(self, config):
         low, high = [], []
@@ -79,28 +125,41 @@ class MPGame(CalcUtil, Selector):
                 low.append(config[i])  # find all combinations that achieved the lowest turn number
             elif e == search_high:
                 high.append(config[i])  # / the highest turn number
+        self.dump_config(search_low, search_high, low, high)
+
+    def dump_config(self, search_low, search_high, low, high, extra=None):
         data = {  # data for json
             'time': datetime.now().strftime("[ %d.%m.%Y | %H:%M:%S ]"),
-            'episodes': str(len(self.game_length)),
+            'episodes': str(self.stats.episodes if self.stream or self.write_to_disk else len(self.game_length)),
             f'low : {search_low}': [NoIndent(e) for e in low],  # NoIndent is used for JSONFlatEncoder
             f'high: {search_high}': [NoIndent(e) for e in high]  # makes list stay in one line
         }
-        with open(self.path + "/config.json", "w+") as file:
+        for k, v in (extra or {}).items():
+            data[k] = NoIndent(v)
+        with open(os.path.join(self.path, "config.json"), "w+") as file:
             file.write(json.dumps(data, indent=4, cls=JSONFlatEncoder))  # write to file in this directory
 
     def show_info(self):
-        game_time = (self.end - self.start) / (self.eps * self.processes)  # calculate simulation time per game
-        hit_p1, miss_p1 = self.extract_info(self.shots_p1)  # average hits and misses
-        hit_p2, miss_p2 = self.extract_info(self.shots_p2)
-        win_p1, win_p2, _ = self.counter(self.wins)  # count wins
-        ff_p1, ff_p2 = sum(self.ff_p1), sum(self.ff_p2)
+        game_time = (self.end - self.start) / self.episodes  # calculate simulation time per game
+        if self.stream or self.write_to_disk:  # everything is in the merged summary
+            hit_p1, miss_p1 = self.stats.hits[0].mean, self.stats.misses[0].mean
+            hit_p2, miss_p2 = self.stats.hits[1].mean, self.stats.misses[1].mean
+            win_p1, win_p2 = self.stats.wins
+            ff_p1, ff_p2 = self.stats.forfeits
+            shortest, longest = self.stats.length.min, self.stats.length.max
+        else:
+            hit_p1, miss_p1 = self.extract_info(self.shots_p1)  # average hits and misses
+            hit_p2, miss_p2 = self.extract_info(self.shots_p2)
+            win_p1, win_p2, _ = self.counter(self.wins)  # count wins
+            ff_p1, ff_p2 = sum(self.ff_p1), sum(self.ff_p2)
+            shortest, longest = min(self.game_length), max(self.game_length)
         eps = win_p1 + win_p2  # episodes played
-        completed = eps // self.processes  # episodes played per process
+        chunks = -(-self.episodes // self.chunk)  # number of chunks, rounded up
         print(f'''
         The algorithm was run for {eps} episodes.
         Compute time was {round(self.end - self.start, 5)} seconds.
         Computing took {round(game_time, 9):.9f} seconds ({round(game_time * 1000000, 5):.5f} μs) per game.
-        Algorithm was run on {self.processes} process(es), with {completed} episodes for each process.
+        Algorithm was run on {self.processes} process(es), in {chunks} chunks of up to {self.chunk} episodes.
         Result write time was {round(self.processing_time-self.end, 5)} seconds.
 
         Results of players:
@@ -121,22 +180,39 @@ class MPGame(CalcUtil, Selector):
                 Forfeits: {ff_p2}
 
             Stats Misc:
-                Shortest game: {min(self.game_length)}
-                Longest game: {max(self.game_length)}''')
-
-    def loop(self, id_):  # function to be looped, constructs two players and one loop
-        return MPLoop(self.get_player(self.n1, id_), self.get_player(self.n2, id_), self.eps).game_loop()
+                Shortest game: {shortest}
+                Longest game: {longest}''')
+        if self.timings is not None:
+            print("\n" + self.timings.report())
 
     def test_loop(self, eps):  # dummy function that doesn't run multiple processes
         return MPLoop(self.get_player(self.n1), self.get_player(self.n2), eps).game_loop()
         # used for testing a single game
 
+    def replay(self, episode: int):
+        """
+        Parameters:
+            episode: int, number of the episode within the whole run
+        Plays a single episode of a seeded run again in this process, e.g. under a profiler.
+        Returns the result tuple of MPLoop.game_loop for that episode.
+        """
+        if self.seed is None:
+            raise ValueError("Only runs with a seed can be replayed.")
+        if self.batch:
+            raise ValueError("Batched runs are seeded per chunk, single episodes can't be replayed.")
+        library = self.library() if self.layouts is not None else None
+        if library is not None:
+            library.ensure(self.library_size)
+        return MPLoop(self.get_player(self.n1, episode // self.chunk), self.get_player(self.n2, episode // self.chunk),
+                      1, seed=self.seed, layouts=library, start=episode, budget=self.budget).game_loop()
+
     def get_player(self, selector, id_=0):
-        return {  # inherited from util.selector.Selector
-            "Random": self.random(),
-            "Hunter": self.hunter(),
-            "Dense": self.dense(id_),
-        }[selector]
+        return {  # inherited from util.selector.Selector, only the requested player is constructed
+            "Random": self.random,
+            "Hunter": self.hunter,
+            "Dense": self.dense,
+            "MonteCarlo": self.montecarlo,
+        }[selector](id_)
 
     def extract_info(self, games):
         hits, misses = [], []
@@ -151,4 +227,5 @@ class MPGame(CalcUtil, Selector):
 
 if __name__ == '__main__':
     # cProfile.run('MPGame((10, 10), False, [5, 4, 3, 3, 2], 10000).test_loop(50)', sort="tottime")
+    # cProfile.run('MPGame((10, 10), False, [5, 4, 3, 3, 2], 10000, seed=1).replay(0)', sort="tottime")
     MPGame((10, 10), False, [5, 4, 3, 3, 2], 10000).game_start()
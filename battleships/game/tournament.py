@@ -0,0 +1,197 @@
+from multiprocessing import Pool
+from itertools import permutations
+from os import cpu_count
+from time import time
+from datetime import datetime
+import numpy as np
+import pathlib
+import json
+import os
+
+from battleships.util.stats import GameStats
+from battleships.util.util import JSONFlatEncoder, NoIndent
+from battleships.util.layouts import LayoutLibrary
+from battleships.game.jobs import Job
+
+
+class Tournament:
+    """
+    Round robin between players given by their Selector names, e.g. ["Random", "Hunter", "Dense"].
+    Every ordered pairing plays (episodes) games, so each pair of players meets in both seat orders.
+    The chunks of all pairings share one process pool, worker processes keep their players between chunks and matchups.
+    Each pairing is summarised with a GameStats instance, see util.stats.
+    With a seed, episode n of every pairing uses the same random streams, all pairings see the same boards if the
+    players place their fleets the same way, with layouts they always do.
+    """
+    def __init__(self, players: list[str], size: tuple[int, int], use_spacer: bool, ships: list[int], episodes: int,
+                 proc=cpu_count(), chunk=None, seed=None, bitboard=False, layouts=None, library=100000):
+        if len(set(players)) != len(players) or len(players) < 2:
+            raise ValueError(f"A tournament needs at least two different players, {players} was given.")
+        self.players = players
+        self.size = size
+        self.use_spacer = use_spacer
+        self.ships = ships
+        self.episodes = episodes  # per ordered pairing
+        self.processes = proc
+        self.pairings = list(permutations(players, 2))
+        if chunk is None:  # about 16 chunks per process over the whole tournament
+            chunk = max(1, episodes * len(self.pairings) // (proc * 16))
+        self.chunk = min(chunk, episodes)
+        self.seed = seed
+        self.bitboard = bitboard
+        self.layouts = layouts  # "sequential" or "uniform", see util.layouts
+        self.library_size = library
+        self.path = os.path.abspath(pathlib.Path(__file__).parent.resolve())
+        self.layout_path = os.path.join(self.path, "layouts")
+        self.stats = {pairing: GameStats(size[0] * size[-1]) for pairing in self.pairings}
+        self.rating = []  # result of ratings(), set once all games are played
+        self.start, self.end = None, None
+
+    def jobs(self) -> list[Job]:
+        jobs = []
+        for n1, n2 in self.pairings:
+            job = Job(n1, n2, self.size, self.use_spacer, self.ships, self.bitboard, stream=True, seed=self.seed,
+                      layouts=(self.layout_path, self.layouts) if self.layouts is not None else None)
+            jobs.extend(job.split(self.episodes, self.chunk))
+        jobs.sort(key=lambda j: j.id)  # interleave the pairings, no pairing finishes long before the others
+        return jobs
+
+    def game_start(self):
+        self.start = time()
+        if self.layouts is not None:
+            LayoutLibrary(self.layout_path, self.size, self.ships, self.use_spacer, self.layouts).ensure(
+                self.library_size)
+        with Pool(processes=self.processes) as pool:
+            for n1, n2, stats in pool.imap_unordered(run_match, self.jobs()):
+                self.stats[(n1, n2)].merge(stats)
+            pool.close()
+            pool.join()
+        self.end = time()
+        self.rating = self.ratings()
+        self.dump()
+        self.show_info()
+
+    def wins(self) -> np.ndarray:
+        """
+        Returns the matrix of wins, entry (i, j) is how often player i beat player j in either seat.
+        """
+        index = {name: i for i, name in enumerate(self.players)}
+        wins = np.zeros((len(self.players), len(self.players)), dtype=np.int64)
+        for (n1, n2), stats in self.stats.items():
+            wins[index[n1], index[n2]] += stats.wins[0]
+            wins[index[n2], index[n1]] += stats.wins[1]
+        return wins
+
+    def win_rates(self) -> np.ndarray:
+        # entry (i, j) is the share of games between i and j that i won, nan on the diagonal
+        wins = self.wins()
+        games = wins + wins.T
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(games > 0, wins / games, np.nan)
+
+    def ratings(self, samples=1000, level=.95) -> list[dict]:
+        """
+        Parameters:
+            samples: int, number of bootstrap resamples for the confidence intervals
+            level: float, confidence level
+        Fits a Bradley-Terry model to the results and returns the rating of every player, best first.
+        Elo is the same model on the Elo scale, a difference of 400 means 10 to 1 odds, the mean is 1500.
+        Confidence intervals come from a parametric bootstrap, the wins of every ordered pairing are redrawn from a
+        binomial distribution with the observed win rate.
+        """
+        wins = self.wins()
+        elo = to_elo(bradley_terry(wins))
+        index = {name: i for i, name in enumerate(self.players)}
+        rng = np.random.default_rng(self.seed)
+        boot = np.empty((samples, len(self.players)))
+        for b in range(samples):
+            resampled = np.zeros_like(wins)
+            for (n1, n2), stats in self.stats.items():
+                games = stats.wins[0] + stats.wins[1]
+                if not games:
+                    continue
+                w = rng.binomial(games, stats.wins[0] / games)
+                resampled[index[n1], index[n2]] += w
+                resampled[index[n2], index[n1]] += games - w
+            boot[b] = to_elo(bradley_terry(resampled))
+        low, high = np.percentile(boot, [(1 - level) / 2 * 100, (1 + level) / 2 * 100], axis=0)
+        strength = bradley_terry(wins)
+        ratings = [{
+            "player": name,
+            "elo": float(elo[i]),
+            "low": float(low[i]),
+            "high": float(high[i]),
+            "strength": float(strength[i]),
+            "games": int(wins[i].sum() + wins[:, i].sum()),
+            "wins": int(wins[i].sum()),
+        } for i, name in enumerate(self.players)]
+        return sorted(ratings, key=lambda r: -r["elo"])
+
+    def dump(self):
+        rates = self.win_rates()
+        data = {
+            'time': datetime.now().strftime("[ %d.%m.%Y | %H:%M:%S ]"),
+            'players': NoIndent(self.players),
+            'episodes per pairing': self.episodes,
+            'win rates': [NoIndent([None if np.isnan(x) else round(float(x), 5) for x in row]) for row in rates],
+            'ratings': [NoIndent([r["player"], round(r["elo"], 1), round(r["low"], 1), round(r["high"], 1)])
+                        for r in self.rating],
+            'pairings': {f'{n1} vs {n2}': NoIndent([stats.wins[0], stats.wins[1], stats.forfeits[0],
+                                                    stats.forfeits[1], round(stats.length.mean, 3)])
+                         for (n1, n2), stats in self.stats.items()}
+        }
+        with open(os.path.join(self.path, "tournament.json"), "w+") as file:
+            file.write(json.dumps(data, indent=4, cls=JSONFlatEncoder))
+
+    def show_info(self):
+        width = max(len(name) for name in self.players) + 2
+        rates = self.win_rates()
+        lines = [" " * width + "".join(f"{name:>{width}}" for name in self.players)]
+        for name, row in zip(self.players, rates):
+            lines.append(f"{name:<{width}}" + "".join(f"{'-' if np.isnan(x) else f'{x:.3f}':>{width}}" for x in row))
+        matrix = "\n        ".join(lines)
+        table = "\n        ".join(f"{r['player']:<{width}}{r['elo']:>8.1f}   [{r['low']:.1f}, {r['high']:.1f}]"
+                                  f"   {r['wins']} / {r['games']}" for r in self.rating)
+        print(f'''
+        The tournament was run for {self.episodes} episodes per pairing, {len(self.pairings)} pairings.
+        Compute time was {round(self.end - self.start, 5)} seconds on {self.processes} process(es).
+
+        Win rates (row against column, both seats):
+        {matrix}
+
+        Ratings (Elo, 95% confidence interval, wins / games):
+        {table}''')
+
+
+def bradley_terry(wins: np.ndarray, prior=.5, iterations=10000, tolerance=1e-10) -> np.ndarray:
+    """
+    Parameters:
+        wins: np.ndarray, (players x players) matrix of wins, row beat column
+        prior: float, virtual wins added in both directions of every pair that played, keeps players without wins or
+            losses finite
+    Returns the Bradley-Terry strength of each player, fitted with the MM algorithm, normalized to a geometric mean of 1.
+    Player i beats player j with probability strength[i] / (strength[i] + strength[j]).
+    """
+    played = (wins + wins.T) > 0
+    w = wins + prior * played
+    n = w + w.T
+    strength = np.ones(len(wins))
+    for _ in range(iterations):
+        new = w.sum(axis=1) / (n / (strength[:, None] + strength[None, :])).sum(axis=1)
+        new /= np.exp(np.log(new).mean())
+        if np.abs(new - strength).max() < tolerance:
+            return new
+        strength = new
+    return strength
+
+
+def to_elo(strength: np.ndarray) -> np.ndarray:
+    return 1500 + 400 * np.log10(strength)
+
+
+def run_match(job: Job):  # module level, so only the job is pickled, tells which pairing the summary belongs to
+    return job.n1, job.n2, job.run()
+
+
+if __name__ == '__main__':
+    Tournament(["Random", "Hunter", "Dense"], (10, 10), False, [5, 4, 3, 3, 2], 1000, seed=0).game_start()
@@ -0,0 +1,223 @@
+import numpy as np
+
+from battleships.core.base import BaseGame
+from battleships.core.placement import placement_index
+
+
+class BatchLoop:
+    """
+    Defines a lockstep game loop for many games at once, expects two player names, the board size, use_spacer, the
+    ships and the number of episodes.
+    Boards and shots of a batch of games are kept as (games x size) arrays, all unfinished games take their turn
+    together. Supports the Random and Hunter players.
+    Does not produce visual output, returns the same results as MPLoop.game_loop.
+    If a GameStats instance is given as stats, every batch is folded into it instead of being stored.
+    If a ResultStore is given as store, every batch is written to it instead.
+    The games depend on seed and on the number of episodes, seeded runs are split into chunks of a fixed size.
+    """
+    players = ("Random", "Hunter")
+    batch = 10000  # games played at once by default, the chunk size of seeded batched runs, see MPGame
+
+    def __init__(self, p1: str, p2: str, size: tuple[int, int], use_spacer: bool, ships: list[int], episodes: int,
+                 batch: int = batch, seed=None, stats=None, store=None):
+        for p in (p1, p2):
+            if p not in self.players:
+                raise ValueError(f"BatchLoop supports the players {self.players}, {p} was given.")
+        self.p1 = p1  # Player 1 and 2
+        self.p2 = p2
+        self.game = BaseGame(size, use_spacer)  # only used for its geometry and placement tables
+        self.use_spacer = bool(use_spacer)
+        self.ships = sorted(ships)  # same order Selector places them in
+        self.episodes = episodes
+        self.batch = batch
+        self.rng = np.random.default_rng(seed)
+        self.stats = stats
+        self.store = store
+
+        self.size = self.game.size
+        self.length = self.game.length
+        self.fields = []  # (placements x ship) matrix of fields for each ship
+        for ship in self.ships:
+            self.game.calculate_combinations(ship)  # raises ShipLengthError for ships that don't fit
+            table = self.game.get_placements(ship)
+            self.fields.append(np.array(table.cells, dtype=np.intp).reshape(-1, ship))
+        self.neighbors = np.array([[x] * 4 for x in range(self.size)], dtype=np.intp)  # padded with the field itself
+        for x, neighbors in enumerate(placement_index(self.game.length, self.game.height).neighbors):
+            self.neighbors[x][:len(neighbors)] = neighbors
+
+        self.wins = []
+        self.shots_p1 = []
+        self.shots_p2 = []
+        self.game_length = []
+        self.config_p1 = []
+        self.config_p2 = []
+
+    def game_loop(self):
+        done = 0
+        while done < self.episodes:
+            n = min(self.batch, self.episodes - done)
+            wins, shots_p1, shots_p2, length, chosen_p1, chosen_p2 = self.play(n)
+            done += n
+            if self.store is not None:  # packed and written straight from the arrays
+                self.store.add_arrays(wins, shots_p1, shots_p2, length, self.fields_of(chosen_p1),
+                                      self.fields_of(chosen_p2))
+                continue
+            self.wins.extend(wins.tolist())
+            self.shots_p1.extend(shots_p1.tolist())
+            self.shots_p2.extend(shots_p2.tolist())
+            self.game_length.extend(length.tolist())
+            self.config_p1.extend(self.config(chosen_p1))
+            self.config_p2.extend(self.config(chosen_p2))
+            if self.stats is not None:  # fold the batch and drop it
+                self.stats.add_results(self.results())
+                self.wins, self.shots_p1, self.shots_p2, self.game_length, self.config_p1, self.config_p2 = \
+                    [], [], [], [], [], []
+        if self.stats is not None:
+            return self.stats
+        if self.store is not None:
+            return self.store.count
+        return self.results()
+
+    def results(self):
+        return self.wins, self.shots_p1, self.shots_p2, self.game_length, self.config_p1, \
+            self.config_p2, [0], [0]
+
+    def placement(self, n: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Parameters:
+            n: int
+        Places a fleet on n boards at once, every ship is drawn uniformly from the placements still legal on its board,
+        which is the distribution BaseGame.random_placement produces.
+        Returns the boards as (n x size) bool array and the chosen placement of each ship as (n x ships) array.
+        """
+        rows = np.arange(n)
+        board = np.zeros((n, self.size), dtype=bool)
+        blocked = np.zeros((n, self.size), dtype=bool)
+        chosen = np.empty((n, len(self.ships)), dtype=np.intp)
+        for k, (ship, fields) in enumerate(zip(self.ships, self.fields)):
+            legal = ~blocked[:, fields].any(axis=2)  # (n x placements)
+            if not legal.any(axis=1).all():
+                raise RecursionError(f"Placing ship of length {ship} failed. Increase the field size or decrease "
+                                     "the number or length of ships.")
+            pick = np.where(legal, self.rng.random(legal.shape), -1.).argmax(axis=1)  # random legal placement
+            chosen[:, k] = pick
+            cells = fields[pick]  # (n x ship)
+            board[rows[:, None], cells] = True
+            if self.use_spacer:
+                blocked[rows[:, None, None], self.neighbors[cells]] = True
+            blocked[rows[:, None], cells] = True
+        return board, chosen
+
+    def policy(self, name: str, n: int):
+        return {"Random": _Random, "Hunter": _Hunter}[name](self, n)
+
+    def play(self, n: int):
+        """
+        Parameters:
+            n: int
+        Plays n games in lockstep.
+        Returns winners, shots of player 1 and 2, game lengths and chosen placements of player 1 and 2 as arrays.
+        """
+        board_p1, chosen_p1 = self.placement(n)
+        board_p2, chosen_p2 = self.placement(n)
+        total = sum(self.ships)
+        players = (self.policy(self.p1, n), self.policy(self.p2, n))
+        boards = (board_p2, board_p1)  # player 1 shoots at the board of player 2 and vice versa
+        shots = (np.zeros((n, self.size), dtype=np.uint8), np.zeros((n, self.size), dtype=np.uint8))
+        hits = (np.zeros(n, dtype=np.intp), np.zeros(n, dtype=np.intp))
+        wins = np.zeros(n, dtype=np.intp)
+        length = np.zeros(n, dtype=np.intp)
+
+        active = np.arange(n)
+        turn = 0
+        while active.size:
+            turn += 1
+            for num in (0, 1):
+                if not active.size:
+                    break
+                pos = players[num].next(active)
+                hit = boards[num][active, pos]
+                shots[num][active, pos] = np.where(hit, 1, 2)  # 1 for hit, 2 for miss
+                hits[num][active] += hit
+                players[num].feedback(active, pos, hit)
+                over = hits[num][active] == total
+                wins[active[over]] = num
+                length[active[over]] = turn
+                active = active[~over]
+
+        return wins, shots[0], shots[1], length, chosen_p1, chosen_p2
+
+    def config(self, chosen: np.ndarray) -> list[list[list[int]]]:
+        # converts chosen placements back to the ship lists BaseGame.ships returns
+        ships = [fields[chosen[:, k]].tolist() for k, fields in enumerate(self.fields)]
+        return [list(game) for game in zip(*ships)]
+
+    def fields_of(self, chosen: np.ndarray) -> np.ndarray:
+        # fields of all ships of each game in fleet order, (games x fleet fields)
+        return np.concatenate([fields[chosen[:, k]] for k, fields in enumerate(self.fields)], axis=1)
+
+
+class _Random:
+    """
+    Vectorized Rand, each game shoots along its own random permutation of the board.
+    """
+    def __init__(self, loop: BatchLoop, n: int):
+        self.order = loop.rng.random((n, loop.size)).argsort(axis=1)
+        self.turn = np.zeros(n, dtype=np.intp)
+
+    def next(self, games: np.ndarray) -> np.ndarray:
+        pos = self.order[games, self.turn[games]]
+        self.turn[games] += 1
+        return pos
+
+    def feedback(self, games, pos, hit):
+        pass
+
+
+class _Hunter:
+    """
+    Vectorized Hunter, random shots on parity fields until something is hit, then the neighbors of every hit are queued
+    in the order left, right, up, down and shot first in first out.
+    """
+    def __init__(self, loop: BatchLoop, n: int):
+        self.rng = loop.rng
+        self.neighbors = loop.neighbors
+        self.valid = self.neighbors != np.arange(loop.size)[:, None]  # padding entries are not valid
+        parity = np.zeros(loop.size, dtype=bool)
+        for x in range(loop.size):
+            parity[x] = not (x // loop.length + x % loop.length) % 2  # same pattern as Hunter.get_parity
+        self.parity = np.tile(parity, (n, 1))
+        self.shot = np.zeros((n, loop.size), dtype=bool)  # fields already chosen
+        self.queued = np.zeros((n, loop.size), dtype=bool)
+        self.queue = np.zeros((n, loop.size), dtype=np.intp)  # every field is queued at most once
+        self.head = np.zeros(n, dtype=np.intp)
+        self.tail = np.zeros(n, dtype=np.intp)
+
+    def next(self, games: np.ndarray) -> np.ndarray:
+        targeting = self.head[games] < self.tail[games]
+        pos = np.empty(games.size, dtype=np.intp)
+
+        t = games[targeting]
+        pos[targeting] = self.queue[t, self.head[t]]  # next in queue
+        self.head[t] += 1
+
+        h = games[~targeting]
+        if h.size:
+            candidates = self.parity[h]
+            empty = ~candidates.any(axis=1)  # parity exhausted, fall back to any field not shot yet
+            candidates[empty] = ~self.shot[h[empty]]
+            pos[~targeting] = np.where(candidates, self.rng.random(candidates.shape), -1.).argmax(axis=1)
+
+        self.shot[games, pos] = True
+        self.parity[games, pos] = False
+        return pos
+
+    def feedback(self, games, pos, hit):
+        games, pos = games[hit], pos[hit]
+        for d in range(4):  # left, right, up, down, like Hunter.directions
+            n = self.neighbors[pos, d]
+            ok = self.valid[pos, d] & ~self.shot[games, n] & ~self.queued[games, n]
+            g, n = games[ok], n[ok]
+            self.queue[g, self.tail[g]] = n
+            self.tail[g] += 1
+            self.queued[g, n] = True
@@ -1,14 +1,47 @@
+from time import perf_counter_ns
+
+from battleships.util.timing import Timings
 
 
 class MPLoop:
     """
     Defines game loop, expects two player class instances and the number of episodes.
     Does not produce visual output and is optimized for speed.
+    If a GameStats instance is given as stats, every game is folded into it instead of being stored.
+    If a ResultStore is given as store, every game is written to it instead.
+    Episodes are numbered within the whole run, the first one of this loop is start.
+    If seed is given, both players and their games are reseeded before episode n from (seed, n), so results don't
+    depend on how the run was split into chunks and each episode can be replayed on its own with start set to n.
+    If a util.timing.Timings instance is given as timings, the phases of every game are timed, see instrument.
+    If a util.layouts.LayoutLibrary is given as layouts, fleets are taken from it instead of being placed randomly,
+    episode n uses layouts 2n for player 1 and 2n + 1 for player 2.
+    If budget is given, every shot is chosen within budget seconds, see GameUtil.shoot_within, and the latency of
+    every turn is recorded in latencies, a util.timing.Timings instance, under the player's name and seat.
     """
-    def __init__(self, p1, p2, episodes):
+    def __init__(self, p1, p2, episodes, stats=None, store=None, seed=None, timings=None,
+                 layouts=None, start=0, budget=None, latencies=None):
         self.p1 = p1  # Player 1 and 2
         self.p2 = p2
         self.episodes = episodes
+        self.stats = stats
+        self.store = store
+        self.seed = seed
+        self.layouts = layouts
+        self.start = start  # number of the first episode of the chunk within the run
+        if layouts is not None:
+            self.prepare = self.place_layout
+        if stats is not None:
+            self.extract = self.fold  # streaming, memory stays constant
+        elif store is not None:
+            self.extract = self.record
+        if timings is not None:
+            self.instrument(timings)
+        self.budget = budget
+        self.latencies = latencies if latencies is not None or budget is None else Timings()
+        if budget is not None:
+            self.check_over = self.check_over_within
+            self.turns = (self.latencies.latency(f"{p1.name} turn [p1]"),
+                          self.latencies.latency(f"{p2.name} turn [p2]"))
         self.wins = []
         self.shots_p1 = []
         self.shots_p2 = []
@@ -22,10 +55,13 @@ class MPLoop:
     def game_loop(self):
         self.p1.initialize(self.p2)
         self.p2.initialize(self.p1)
-        for _ in range(self.episodes):
+        for episode in range(self.start, self.start + self.episodes):  # seeds and layouts share the numbering
+            if self.seed is not None:
+                self.p1.seed(f"{self.seed}:{episode}:p1")
+                self.p2.seed(f"{self.seed}:{episode}:p2")
             self.cnt = 0
-            self.prepare(self.p1)
-            self.prepare(self.p2)
+            self.prepare(self.p1, 2 * episode)
+            self.prepare(self.p2, 2 * episode + 1)
             while 1:
                 over, win = self.check_over(self.p2, self.p1, 0)
                 if over:
@@ -37,14 +73,35 @@ class MPLoop:
             self.extract(win)
             self.reset(self.p1)
             self.reset(self.p2)
+        self.p1.close()
+        self.p2.close()
+        if self.stats is not None:
+            return self.stats
+        if self.store is not None:
+            self.store.flush()
+            return self.store.count
         return self.wins, self.shots_p1, self.shots_p2, self.game_length, self.config_p1, \
             self.config_p2, [self.ff_p1], [self.ff_p2]
 
+    def instrument(self, timings):
+        """
+        Parameters:
+            timings: util.timing.Timings
+        Wraps result extraction and the hot methods of both players and their games, the players stay instrumented.
+        """
+        self.extract = timings.wrap(self.extract, "MPLoop.extract")
+        for inst in (self.p1, self.p2):
+            inst.instrument(timings)
+
     @staticmethod
-    def prepare(inst):
+    def prepare(inst, _=None):
         inst.placement()
         inst.alive_update()
 
+    def place_layout(self, inst, index):
+        inst.game.set_placements(inst.ships, self.layouts.layout(index))
+        inst.alive_update()
+
     @staticmethod
     def reset(inst):
         inst.reset()
@@ -59,6 +116,16 @@ class MPLoop:
             return True, num
         return False, None
 
+    def check_over_within(self, inst, other, num):
+        if inst.game.game_over:
+            return True, num
+        start = perf_counter_ns()
+        other.shoot_within(inst, self.budget)
+        self.turns[num](perf_counter_ns() - start)
+        if inst.game.game_over:
+            return True, num
+        return False, None
+
     def extract(self, win):
         self.wins.append(win)
         self.shots_p1.append(self.p2.game.shots)
@@ -70,3 +137,16 @@ class MPLoop:
             self.ff_p1 += 1
         elif self.p2.game.game_forfeit:
             self.ff_p2 += 1
+
+    def fold(self, win):
+        self.stats.add(win, self.p2.game.shots_view, self.p1.game.shots_view, self.cnt + 1, self.p1.game.ships,
+                       self.p2.game.ships)
+        if self.p1.game.game_forfeit:
+            self.stats.forfeit(0)
+        elif self.p2.game.game_forfeit:
+            self.stats.forfeit(1)
+
+    def record(self, win):
+        self.store.add(win, bytearray(self.p2.game.shots_view), bytearray(self.p1.game.shots_view), self.cnt + 1,
+                       self.p1.game.ships, self.p2.game.ships, self.p1.game.game_forfeit, self.p2.game.game_forfeit and
+                       not self.p1.game.game_forfeit)
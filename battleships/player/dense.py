@@ -1,42 +1,74 @@
 
 from battleships.core.base import BaseGame
+from battleships.core.placement import Placements
+from battleships.util.resolver import SunkResolver
+from battleships.util.monitor import Monitor
 from battleships.util.util import GameUtil
 
-import warnings
-import itertools
+from collections import Counter, deque
+from time import perf_counter_ns
+import numpy as np
 import pathlib
 import os
 
 
+_fields = {}  # (length, height, ship) -> placement arrays, shared by all Dense instances of a process
+
+
+def placement_arrays(table: Placements) -> tuple[np.ndarray, list[np.ndarray]]:
+    """
+    Parameters:
+        table: Placements
+    Returns the placements of table as a (placements x ship) matrix of fields and, for every field, the indices of the
+    placements covering it. Built once per board geometry and ship length.
+    """
+    key = (table.length, table.height, table.ship)
+    if key not in _fields:
+        fields = np.array(table.cells, dtype=np.intp).reshape(-1, table.ship)
+        by_cell = [np.array(ids, dtype=np.intp) for ids in table.by_cell]
+        _fields[key] = fields, by_cell
+    return _fields[key]
+
+
 class Dense(GameUtil):
-    def __init__(self, ships: list, inst: BaseGame, id_=0, monitor=False):
+    def __init__(self, ships: list, inst: BaseGame, id_=0, monitor: bool or Monitor = False, vectorize=True):
         super().__init__()
         self.game = inst
         self.ships = ships
         self.remaining_ships = self.ships.copy()
         self.size = self.game.size
         self.path = os.path.abspath(pathlib.Path(__file__).parent.resolve())  # get directory of dense.py
-        # monitoring function
+        # monitoring function, every game ends up in .\data\ as one file, see util.monitor
+        self.monitor = None
         if monitor:
-            self.length = self.game.length
-            warnings.warn(
-                "monitor potentially creates lots of small files in .\\data\\, especially when used with benchmark.py. "
-                "Use at your own discretion", RuntimeWarning)
-
+            self.monitor = monitor if isinstance(monitor, Monitor) else Monitor(os.path.join(self.path, "data"),
+                                                                                self.game.length)
             self.shoot_nc = self.shoot_monitor  # assign monitoring function
-            path = self.path + "./data/"
-            if not os.path.exists(path):  # make sure dir exists
-                os.mkdir(path)
         else:
             self.shoot_nc = self.shoot_none  # assign function without monitor call
+        if vectorize:  # numpy versions of the score map functions, the pure python ones stay as a fallback
+            self.create_score_map = self.create_score_map_np
+            self.hunter_score = self.hunter_score_np
+            self.discount = self.discount_np
+            self.quick_shot = self.quick_shot_np
         # internal game variables
         self.tracked_hits = []
         self.shot = []
+        # target mode, bit n of each mask corresponds to field n
+        self.tracked = 0  # mask of self.tracked_hits
+        self.dead = 0  # shot fields that can't be part of a ship that is still afloat, misses and removed hits
+        self.candidates = {ship: set() for ship in self.ships}  # ship length -> combinations through tracked hits
         self.last_updated = []
         self.remove_queue = []
+        self.resolver = SunkResolver()  # disambiguates queued sunken ships
         self.last_pos = None
         self.distribution = None
         self.distribution_master = None
+        # time budgeted shots, see shoot_within
+        self.defer = False  # postpone rebuilding the score map after a sunken ship
+        self.stale = False  # the score map still lacks a sunken ship
+        self.pending = deque()  # shot fields not yet discounted from the score map
+        self.cost = 0  # moving average of the cost of rebuilding the score map in ns
 
         # shot and round tracker
         self.cnt = 0
@@ -69,9 +101,29 @@ class Dense(GameUtil):
             inst.game.shoot(pos)
             self.after_shot(inst, pos)
         except Exception as e:
-            with open(self.path + f"\\error\\error_{self.id}.txt", "a") as file:
-                file.write(str(inst.game.ships) + f" {self.cnt} " + str(e) + "\n")
-            self.game.forfeit()
+            self.forfeit(inst, e)
+
+    def shoot_within(self, inst, budget: float):
+        """
+        Parameters:
+            inst: Class, middle-layer instance of BaseGame
+            budget: float, seconds the shot may take
+        Takes a turn with the best shot get_shot_within finds in budget.
+        Rebuilding the score map after a sunken ship is left to the next shot that has time for it.
+        """
+        try:
+            pos = self.get_shot_within(inst, perf_counter_ns() + int(budget * 1e9))
+            inst.game.shoot(pos)
+            self.defer = True
+            self.after_shot(inst, pos)
+            self.defer = False
+        except Exception as e:
+            self.forfeit(inst, e)
+
+    def forfeit(self, inst, e):
+        with open(self.path + f"\\error\\error_{self.id}.txt", "a") as file:
+            file.write(str(inst.game.ships) + f" {self.cnt} " + str(e) + "\n")
+        self.game.forfeit()
 
     def shoot_monitor(self, inst):
         pos, m = self.get_shot(inst)  # get position and map
@@ -82,8 +134,49 @@ class Dense(GameUtil):
     def get_shot(self, inst):
         if self.tracked_hits:  # if non-sunk ships are present, target them else find a new target
             return self.target_score(inst)
+        if self.stale:  # left behind by shoot_within
+            self.rebuild(inst)
+        elif self.pending:  # the latest shots are discounted along with them, see discount
+            self.pending.extend(self.find_difference(inst))
+            self.discount(inst, self.pending)
+            self.pending.clear()
         return self.hunter_score(inst)
 
+    def get_shot_within(self, inst, deadline: int) -> int:
+        """
+        Parameters:
+            inst: Class, middle-layer instance of BaseGame
+            deadline: int, perf_counter_ns() by which the shot must be chosen
+        Anytime version of get_shot, refines the shot while time is left and returns the best one found.
+        Hunting rebuilds the score map after a sunken ship if that fits in the remaining time on average, then
+        discounts one new shot field after the other until time runs out, leaving the rest for later shots. The shot
+        is the best unshot field of the map as far as it got.
+        Targeting scores as many candidates as time allows.
+        """
+        if self.tracked_hits:
+            return self.target_score_within(inst, deadline)
+        if self.stale:
+            start = perf_counter_ns()
+            if start + self.cost <= deadline:
+                self.rebuild(inst)
+                ns = perf_counter_ns() - start
+                self.cost = ns if not self.cost else (7 * self.cost + ns) // 8
+            else:  # decays while it keeps the map stale, so a rebuild that was slow once gets retried
+                self.cost = self.cost * 7 // 8
+        if not self.stale:
+            self.pending.extend(self.find_difference(inst))
+        while self.pending and perf_counter_ns() < deadline:
+            self.discount(inst, (self.pending.popleft(),))
+        return self.quick_shot(inst)
+
+    def quick_shot(self, inst) -> int:
+        # best unshot field of the score map as it is, possibly behind on the latest shots or sunken ships
+        shots, distribution = inst.game.shots_view, self.distribution
+        return max((x for x in range(self.size) if not shots[x]), key=distribution.__getitem__)
+
+    def quick_shot_np(self, inst) -> int:  # numpy version of quick_shot
+        return int(np.where(np.frombuffer(inst.game.shots_view, dtype=np.uint8), -1, self.distribution).argmax())
+
     def after_shot(self, inst, pos):
         self.cnt += 1  # increment shot counter
         self.last_pos = pos  # save last_pos
@@ -91,6 +184,9 @@ class Dense(GameUtil):
 
         if inst.game.last_shot:  # if last shot was a hit append to tracked hits
             self.tracked_hits.append(pos)
+            self.track(inst, pos)
+        else:
+            self.kill(inst, pos)
         self.tracked_hits.sort()  # sort, just for good measure
 
         if inst.game.ship_sunk:  # if a ship was sunken, get length and try to remove it from the tracked shots
@@ -100,16 +196,18 @@ class Dense(GameUtil):
         if self.remove_queue:  # if a remove queue is present try to clear it
             self.try_remove_queue(inst)
 
+    def candidate_ids(self, inst, length, last_pos):
+        """
+        Returns the indices of all placements of a ship of length (length) through last_pos that consist of tracked
+        hits only, in the order of BaseGame.calculate_combinations.
+        """
+        table = inst.game.get_placements(length)
+        return [i for i in table.by_cell[last_pos] if table.masks[i] & self.tracked == table.masks[i]]
+
     def combinations(self, inst, length, last_pos):
-        combinations = inst.game.calculate_combinations(length)  # all the combinations of a ship length n
-        c = []
-        possible_combinations = [list(x) for x in itertools.combinations(self.tracked_hits, length)]
-        # all combinations of length n that fit in tracked hits
-        for combination in combinations:
-            if combination in possible_combinations and last_pos in combination:
-                c.append(combination)
-                # if the combination is possible, and it contains a spot where a ship is located, add it to the buffer
-        return c
+        table = inst.game.get_placements(length)
+        return [table.placement(i) for i in self.candidate_ids(inst, length, last_pos)]
+        # combinations that fit in tracked hits and contain the spot where the ship was sunken
 
     def remove_from_target(self, inst, length):
         c = self.combinations(inst, length, self.last_pos)  # get the combinations
@@ -119,51 +217,65 @@ class Dense(GameUtil):
             if len(c):
                 for spot in c[0]:
                     self.tracked_hits.remove(spot)  # remove it from tracked hits
+                    self.kill(inst, spot)
                 self.remaining_ships.remove(length)  # mark ship as sunk
             self.update_distribution(inst)
 
     def try_remove_queue(self, inst):
-        ship_combinations = []
-        for ship in self.remove_queue:
-            ship_combinations.append(self.combinations(inst, ship[1], ship[0]))  # get combination of each ship
-        possible_pairings = list(itertools.product(*ship_combinations))  # pair them all up in length of remove_queue
-
-        valid = []
-        for pair in possible_pairings:  # format is something like [[x, y], [z, a, b]]
-            flat = self.flatten(pair)  # flatten the pair into one list -> [x, y, z, a, b]
-            if len(set(flat)) == len(flat):  # if length of set is equal to length of initial no element is a duplicate
-                valid.append(pair)  # this means the pairing is valid
-        if len(valid) == 1:  # if just one pairing is present
-            for ship in valid[0]:  # loop through each ship in the pairing
-                for spot in ship:
-                    self.tracked_hits.remove(spot)  # remove all spots from tracked hits
-                self.remaining_ships.remove(len(ship))  # mark ship as sunk
-                for t_ship in self.remove_queue:  # loop through remove queue and find the ship
-                    if t_ship[0] in ship and len(ship) == t_ship[1]:  # right ship must contain the shot position
-                        self.remove_queue.remove(t_ship)
-            self.update_distribution(inst)
+        tables, ids = [], []
+        for pos, length in self.remove_queue:
+            tables.append(inst.game.get_placements(length))
+            ids.append(self.candidate_ids(inst, length, pos))  # get combinations of each ship
+        choices = self.resolver.solve([[table.masks[i] for i in c] for table, c in zip(tables, ids)])
+        # index of the combination of every ship that is certain, None if it is still ambiguous
+        if all(choice is None for choice in choices):
+            return  # wait for more information
 
-    @staticmethod
-    def flatten(t):  # https://stackoverflow.com/a/952952/12203337
-        return [item for sublist in t for item in sublist]
+        queue = []
+        for ship, table, c, choice in zip(self.remove_queue, tables, ids, choices):
+            if choice is None:
+                queue.append(ship)  # keep ambiguous ships queued
+                continue
+            for spot in table.placement(c[choice]):
+                self.tracked_hits.remove(spot)  # remove all spots from tracked hits
+                self.kill(inst, spot)
+            self.remaining_ships.remove(ship[1])  # mark ship as sunk
+        self.remove_queue = queue
+        self.update_distribution(inst)
 
     def update_distribution(self, inst):
+        if self.defer:
+            self.stale = True
+            return
+        self.rebuild(inst)
+
+    def rebuild(self, inst):
         self.distribution = self.create_score_map(inst)
         self.find_difference(inst)
+        self.pending.clear()  # part of the new map
+        self.stale = False
 
     def hunter_score(self, inst):  # see create_score_map
-        shots = inst.game.shots
-        for field in self.find_difference(inst):  # this time only for new fields
+        self.discount(inst, self.find_difference(inst))  # this time only for new fields
+        return self.distribution.index(max(self.distribution)), self.distribution
+
+    def discount(self, inst, fields):
+        # removes the combinations that became impossible by the shots at fields from the score map
+        # fields are discounted in order, each against the shots the map already accounts for, so the later fields
+        # and those still pending count as not shot, a combination through several of them is removed once
+        shots = inst.game.shots_view
+        unseen = {*fields, *self.pending}
+        for field in fields:
             for ship in self.remaining_ships:
                 for combination in inst.game.calculate_spot_combinations(ship, field):
-                    if not any(shots[x] for x in combination if x != field):
+                    if not any(shots[x] and x not in unseen for x in combination):
                         for spot in combination:
                             self.distribution[spot] -= 1
-        return self.distribution.index(max(self.distribution)), self.distribution
+            unseen.discard(field)
 
     def create_score_map(self, inst):
         score_map = [0] * self.size  # make a list the size of the game board, fill it with zeros
-        shots = inst.game.shots  # get all the shots
+        shots = inst.game.shots_view  # get all the shots, read in place
         for ship in self.remaining_ships:  # loop through all remaining ships
             all_combinations = inst.game.calculate_combinations(ship)  # get all the combinations
             for combination in all_combinations:  # loop through them
@@ -172,56 +284,129 @@ class Dense(GameUtil):
                         score_map[x] += 1  # add to each spot of the combination
         return score_map
 
+    def hunter_score_np(self, inst):  # numpy version of hunter_score
+        self.discount(inst, self.find_difference(inst))
+        return int(self.distribution.argmax()), self.distribution
+
+    def discount_np(self, inst, fields):  # numpy version of discount
+        shots = np.frombuffer(inst.game.shots_view, dtype=np.uint8).astype(bool)
+        shots[list({*fields, *self.pending})] = False  # shots the map accounts for, see discount
+        for field in fields:
+            for ship, n in Counter(self.remaining_ships).items():
+                cells, by_cell = placement_arrays(inst.game.get_placements(ship))
+                combinations = cells[by_cell[field]]  # all combinations through field
+                free = combinations[~shots[combinations].any(axis=1)]  # no other accounted field is shot
+                self.distribution -= n * np.bincount(free.ravel(), minlength=self.size)
+            shots[field] = True
+
+    def create_score_map_np(self, inst):  # numpy version of create_score_map
+        score_map = np.zeros(self.size, dtype=np.int64)
+        shots = np.frombuffer(inst.game.shots_view, dtype=np.uint8).astype(bool)
+        for ship, n in Counter(self.remaining_ships).items():  # ships of the same length share their combinations
+            cells, _ = placement_arrays(inst.game.get_placements(ship))
+            free = cells[~shots[cells].any(axis=1)]  # combinations that contain no field that has been shot at
+            score_map += n * np.bincount(free.ravel(), minlength=self.size)  # count every spot of each combination
+        return score_map
+
     def find_difference(self, inst):
-        shots = inst.game.shots
+        shots = inst.game.shots_view
         updated = [i for i, x in enumerate(shots) if x]  # every shot field
-        result = [x for x in updated if x not in self.last_updated]  # every shot field that hasn't been checked yet
+        checked = set(self.last_updated)
+        result = [x for x in updated if x not in checked]  # every shot field that hasn't been checked yet
         self.last_updated = updated
         return result
 
+    def track(self, inst, pos):
+        """
+        Parameters:
+            inst: Class, middle-layer instance of BaseGame
+            pos: int
+        Marks pos as tracked hit and adds all combinations through it that contain no dead field to the candidates.
+        """
+        self.tracked |= 1 << pos
+        for ship, candidates in self.candidates.items():
+            table = inst.game.get_placements(ship)
+            masks = table.masks
+            candidates.update(i for i in table.by_cell[pos] if not masks[i] & self.dead)
+
+    def kill(self, inst, pos):
+        """
+        Parameters:
+            inst: Class, middle-layer instance of BaseGame
+            pos: int
+        Marks pos as dead (missed or part of a removed ship) and prunes all candidates through it.
+        """
+        self.tracked &= ~(1 << pos)
+        self.dead |= 1 << pos
+        for ship, candidates in self.candidates.items():
+            candidates.difference_update(inst.game.get_placements(ship).by_cell[pos])
+
     def target_score(self, inst):
         score_map = [0] * self.size  # make a list the size of the game board, fill it with zeros
-        shots = inst.game.shots  # get all the shots
-        valid = [x for x in self.shot if shots[x] != 1]
-        for ship in self.remaining_ships:  # loop through all remaining ships
-            all_combinations = inst.game.calculate_combinations(ship)  # get all the combinations
-            for combination in all_combinations:  # loop through them
-                if not any(x in combination for x in valid):
-                    # no field has been shot except if it's a hit, that's fine
-                    if len([0 for x in combination if not shots[x] == 2]) == ship:
-                        # the combination contains no missed spots and is the correct length
-                        if not len([0 for x in combination if shots[x]]) == ship:
-                            # not all spots have been shot
-                            a = sum([x in self.tracked_hits for x in combination])
-                            # test if any spot of the combination is already tracked, count True
-                            if a:  # there are tracked fields
-                                if not any(x in combination for x in self.shot if x not in self.tracked_hits):
-                                    # no spots have been shot at and if they have been they are currently tracked
-                                    # (they could be from some already sunken ship)
-                                    for x in combination:
-                                        if x not in self.tracked_hits and x not in self.shot:
-                                            # if x is not tracked and has not been shot
-                                            score_map[x] += a
-                                            # add length of a, to weight longer combinations better
-                                            # helps to continue shooting in the same direction
+        shot = self.tracked | self.dead  # every field that has been shot at
+        for ship, n in Counter(self.remaining_ships).items():  # loop through all remaining ships
+            table = inst.game.get_placements(ship)
+            for i in self.candidates[ship]:
+                # candidates contain at least one tracked hit and no missed field or field of a removed ship
+                # (they could be from some already sunken ship)
+                a = (table.masks[i] & self.tracked).bit_count() * n
+                # count tracked fields of the combination, to weight longer combinations better
+                # helps to continue shooting in the same direction
+                for x in table.cells[i * ship:(i + 1) * ship]:
+                    if not shot >> x & 1:  # if x has not been shot
+                        score_map[x] += a
         return score_map.index(max(score_map)), score_map
 
+    def target_score_within(self, inst, deadline: int) -> int:
+        # target_score over the candidates scored before deadline, the clock is read every 32 candidates
+        score_map = [0] * self.size
+        shot = self.tracked | self.dead
+        scored = 0
+        for ship, n in Counter(self.remaining_ships).items():
+            table = inst.game.get_placements(ship)
+            for i in self.candidates[ship]:
+                if not scored & 31 and scored and perf_counter_ns() > deadline:
+                    break
+                scored += 1
+                a = (table.masks[i] & self.tracked).bit_count() * n
+                for x in table.cells[i * ship:(i + 1) * ship]:
+                    if not shot >> x & 1:
+                        score_map[x] += a
+            else:
+                continue
+            break
+        best = max(score_map)
+        return score_map.index(best) if best else self.quick_shot(inst)
+
     def prepare_monitor(self, inst, field):
         data = {
             "Score Map": field,
-            "Shots": inst.game.shots,
+            "Shots": inst.game.shots_view,  # copied by the monitor
             "Tracked Hits": [1 if i in self.tracked_hits else 0 for i in range(self.size)],
-            "Board": inst.game.board
+            "Board": inst.game.board_view
         }
-        self.monitor(data, self.length, f"{self.path}/data/{self.id}_{self.round}_{self.cnt}")
+        self.monitor.push(data)
+
+    def close(self):
+        if self.monitor is not None:
+            self.monitor.close()
 
     def reset(self):  # reset from game to game
         self.remaining_ships = self.ships.copy()  # all of them are alive again
-        # self.distribution = self.distribution_master.copy()  # reset the score map
+        self.distribution = self.distribution_master.copy()  # reset the score map
+        self.defer = False
+        self.stale = False
+        self.pending.clear()
         self.shot = []  # or shots
         self.tracked_hits = []  # no tracked hits
+        self.tracked = 0
+        self.dead = 0
+        for candidates in self.candidates.values():  # no combinations to target
+            candidates.clear()
         self.remove_queue = []  # there's nothing to be queued
-        # self.last_updated = []  # reset spots to update
+        self.last_updated = []  # reset spots to update
         self.last_pos = None  # nothing was shot
+        if self.monitor is not None:
+            self.monitor.end(f"{self.id}_{self.round}")
         self.round += 1  # next round
         self.cnt = 0  # we start at turn 0
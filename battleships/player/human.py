@@ -59,7 +59,7 @@ class HumanIO(GameUtil):  # todo add forfeit method, user should be able to ff a
                 print("This is not a valid position. Please try again.")
             else:
                 pos = self.convert(pos)  # convert to number for indexing
-                if not inst.game.shots[pos]:  # check if pos was already shot at
+                if not inst.game.is_shot(pos):  # check if pos was already shot at
                     inst.game.shoot(pos)  # make the shot
                     if inst.game.last_shot:  # if flag last_shot is true something was hit
                         print("It's a hit!")
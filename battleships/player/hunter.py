@@ -1,25 +1,35 @@
-
-from random import randint
+from collections import deque
 
 from battleships.core.base import BaseGame
+from battleships.core.placement import placement_index
 from battleships.util.util import GameUtil
 
 
 class Hunter(GameUtil):
-    def __init__(self, ships: list, inst: BaseGame):
+    def __init__(self, ships: list, inst: BaseGame, rng=None):
         super().__init__()
         self.game = inst
-        self.shots = list(range(self.game.size))
+        if rng is not None:
+            self.rng = rng
         self.lines = self.game.get_lines()
-        self.parity = self.get_parity()
-        self.parity_c = self.parity.copy()
+        self.neighbors = placement_index(self.game.length, self.game.height).neighbors  # left, right, up, down
+        self.parity_c = self.get_parity()
+        self.parity_at_c = [-1] * self.game.size
+        for i, x in enumerate(self.parity_c):
+            self.parity_at_c[x] = i
         self.ships = ships
         self.name = "Hunter"
         self.get_shot = self.strategy
-        self.directions = [-1, 1, -self.game.length, self.game.length]
 
-        self.to_shoot = []
+        # fields are removed by moving the last field into their place, x_at[field] is the index in x or -1
+        self.shots = []  # fields not shot yet
+        self.shots_at = []
+        self.parity = []  # parity fields not shot yet
+        self.parity_at = []
+        self.queued = bytearray()  # 1 for every field that was put in to_shoot
+        self.to_shoot = deque()
         self.pos = None
+        self.reset()
 
     def reset_target(self):
         return
@@ -52,37 +62,43 @@ class Hunter(GameUtil):
         inst.game.shoot(pos)
 
     def strategy(self, inst):
-        if inst.game.last_shot:
-            line = self.lines
-            for x in line:
-                if self.pos in x:
-                    line = x
-                    break
-            dirs = [self.pos + x for x in self.directions[:2] if self.pos + x in line and self.pos + x in self.shots
-                    and self.pos + x not in self.to_shoot]  # up, down
-            dirs.extend([self.pos + x for x in self.directions[2:] if self.pos + x in self.shots
-                         and self.pos + x not in self.to_shoot])  # left, right
-            self.to_shoot.extend(dirs)
+        if inst.game.last_shot:  # queue the neighbors of the hit that are neither shot nor queued
+            shots_at, queued = self.shots_at, self.queued
+            for x in self.neighbors[self.pos]:
+                if shots_at[x] >= 0 and not queued[x]:
+                    queued[x] = 1
+                    self.to_shoot.append(x)
 
-        if not self.to_shoot:
-            self.pos = self.parity.pop(randint(0, len(self.parity) - 1))  # random pick from parity list
-        else:
-            self.pos = self.to_shoot.pop(0)  # next in to_shoot list
+        if self.to_shoot:
+            self.pos = self.to_shoot.popleft()  # next in to_shoot
+        elif self.parity:
+            self.pos = self.parity[self.rng.randint(0, len(self.parity) - 1)]  # random pick from parity list
+        else:  # parity is exhausted, only possible with ships of length 1
+            self.pos = self.shots[self.rng.randint(0, len(self.shots) - 1)]
         self.rem(self.pos)
         return self.pos
 
     def rem(self, pos):
-        try:
-            self.parity.remove(pos)
-        except ValueError:
-            pass
-        try:
-            self.shots.remove(pos)
-        except ValueError:
-            pass
+        self.discard(self.parity, self.parity_at, pos)
+        self.discard(self.shots, self.shots_at, pos)
+
+    @staticmethod
+    def discard(fields: list[int], at: list[int], pos: int):
+        # removes pos from fields in O(1) by moving the last field into its place
+        i = at[pos]
+        if i < 0:
+            return
+        last = fields.pop()
+        if last != pos:
+            fields[i] = last
+            at[last] = i
+        at[pos] = -1
 
     def reset(self):
         self.shots = list(range(self.game.size))
+        self.shots_at = list(range(self.game.size))
         self.parity = self.parity_c.copy()
-        self.to_shoot = []
+        self.parity_at = self.parity_at_c.copy()
+        self.queued = bytearray(self.game.size)
+        self.to_shoot.clear()
         self.pos = None
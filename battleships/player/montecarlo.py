@@ -0,0 +1,383 @@
+from multiprocessing import Pool
+from random import Random
+from time import perf_counter_ns
+
+from battleships.core.base import BaseGame
+from battleships.core.placement import placement_index
+from battleships.util.util import GameUtil
+
+
+class LayoutSampler:
+    """
+    Fleet layouts consistent with what a player has seen of the opponent's board: no ship covers a miss, every hit is
+    covered, a ship still afloat is not fully hit and every sunken ship is a fully hit placement through the field
+    that sank it. Ships may not overlap, or touch with use_spacer.
+    Layouts are sampled uniformly by Gibbs sampling, one step moves a single ship to a uniformly chosen placement that
+    is legal given the others, a sweep moves every ship once and then random blocks of ships together, see
+    block_step, single steps alone don't reach every layout. All checks are bitmask operations on the shared
+    placement tables, see core.placement.
+    The state is the placement index of every ship, it can be handed on to the sampler of the next shot.
+    """
+    def __init__(self, length: int, height: int, ships: list[int], use_spacer: bool, hits: int, misses: int,
+                 sunk: list[tuple[int, int]], rng: Random, state=None):
+        index = placement_index(length, height)
+        self.size = length * height
+        self.ships = ships
+        self.tables = [index.get(ship) for ship in ships]
+        self.masks = [table.masks for table in self.tables]
+        self.blocks = [table.halos if use_spacer else table.masks for table in self.tables]  # may not hit the others
+        self.hits = hits
+        self.spacer = use_spacer
+        self.rng = rng
+
+        self.domains = [None] * len(ships)  # legal placements of every ship on its own
+        self.afloat = [True] * len(ships)
+        for pos, length_ in sunk:  # ships of the same length are interchangeable, the first one afloat is sunken
+            k = next(k for k, ship in enumerate(ships) if ship == length_ and self.afloat[k])
+            self.afloat[k] = False
+            masks = self.masks[k]
+            self.domains[k] = [i for i in self.tables[k].by_cell[pos] if not masks[i] & ~hits]
+        free = {}  # ship length -> placements without miss that aren't fully hit, shared by ships of one length
+        for k, ship in enumerate(ships):
+            if self.afloat[k]:
+                if ship not in free:
+                    masks = self.masks[k]
+                    free[ship] = [i for i in self.tables[k].ids if not masks[i] & misses and masks[i] & ~hits]
+                self.domains[k] = free[ship]
+        self.domain_masks = [[self.masks[k][i] for i in domain] for k, domain in enumerate(self.domains)]
+        self.allowed = []  # allowed[k][i] is 1 if placement i is in the domain of ship k
+        for k, domain in enumerate(self.domains):
+            allowed = bytearray(self.tables[k].count)
+            for i in domain:
+                allowed[i] = 1
+            self.allowed.append(allowed)
+
+        self.state = state if state is not None and self.consistent(state) else None
+        self.covered = self.cover(self.state) if self.state is not None else 0  # union of all ships
+        self.fresh = self.state is None  # a new state needs burn in sweeps before its samples can be used
+
+    def consistent(self, state: list[int]) -> bool:
+        blocked, covered = 0, 0
+        for k, i in enumerate(state):
+            if not self.allowed[k][i] or self.masks[k][i] & blocked:
+                return False
+            blocked |= self.blocks[k][i]
+            covered |= self.masks[k][i]
+        return not self.hits & ~covered
+
+    def cover(self, state: list[int]) -> int:
+        covered = 0
+        for k, i in enumerate(state):
+            covered |= self.masks[k][i]
+        return covered
+
+    def construct(self, limit: int = 20000) -> bool:
+        """
+        Parameters:
+            limit: int, maximum number of search nodes
+        Finds a random consistent layout by backtracking, uncovered hits first. Returns whether one was found.
+        """
+        state = [None] * len(self.ships)
+        nodes = 0
+
+        def place(blocked: int, covered: int) -> bool:
+            nonlocal nodes
+            nodes += 1
+            if nodes > limit:
+                return False
+            need = self.hits & ~covered
+            unplaced = [k for k, i in enumerate(state) if i is None]
+            if not unplaced:
+                return not need
+            if need:  # some ship has to cover the lowest uncovered hit
+                h = (need & -need).bit_length() - 1
+                options = [(k, i) for k in unplaced for i in self.tables[k].by_cell[h]
+                           if self.allowed[k][i] and not self.masks[k][i] & blocked]
+            else:  # most constrained ship first
+                k = min(unplaced, key=lambda k: len(self.domains[k]))
+                options = [(k, i) for i in self.domains[k] if not self.masks[k][i] & blocked]
+            self.rng.shuffle(options)
+            for k, i in options:
+                state[k] = i
+                if place(blocked | self.blocks[k][i], covered | self.masks[k][i]):
+                    return True
+                state[k] = None
+            return False
+
+        if not place(0, 0):
+            return False
+        self.state = state
+        self.covered = self.cover(state)
+        return True
+
+    def step(self, k: int, weights=None, tries: int = 8):
+        """
+        Parameters:
+            k: int
+            weights: list[float] or None, per placement of ship k
+            tries: int, uniform proposals before the legal placements are filtered
+        Moves ship k to a uniformly chosen placement that is legal given the other ships.
+        With weights, the whole distribution the placement was drawn from is added to weights, 1 / options for every
+        option. That estimates the same probabilities as counting the drawn placement with far less noise.
+        """
+        state, masks = self.state, self.masks[k]
+        covered = self.covered & ~masks[state[k]]  # ships don't overlap, so this is what the others cover
+        if self.spacer:
+            blocked = 0
+            for j, i in enumerate(state):
+                if j != k:
+                    blocked |= self.blocks[j][i]
+        else:
+            blocked = covered
+        need = self.hits & ~covered  # hits only ship k can cover
+        random = self.rng.random
+        options = None
+        if need:
+            allowed = self.allowed[k]
+            ids = self.tables[k].by_cell[(need & -need).bit_length() - 1]
+            options = [i for i in ids if allowed[i] and not masks[i] & blocked and masks[i] & need == need]
+        elif weights is None:  # uniform proposals are accepted if legal, most are early on
+            domain = self.domains[k]
+            for _ in range(tries):
+                i = domain[int(random() * len(domain))]
+                if not masks[i] & blocked:
+                    break
+            else:  # filter if they keep failing
+                options = [i for i in domain if not masks[i] & blocked]
+        else:
+            options = [i for i in self.domains[k] if not masks[i] & blocked]
+        if options is not None:
+            i = options[int(random() * len(options))]  # the current placement is always an option
+            if weights is not None:
+                w = 1 / len(options)
+                for j in options:
+                    weights[j] += w
+        state[k] = i
+        self.covered = covered | masks[i]
+
+    def block_step(self, block: list[int]):
+        """
+        Parameters:
+            block: list[int], ships moved together
+        Moves the ships of block together, Metropolis-Hastings with a uniform target.
+        Single steps can't hand a hit from one ship to another, the ship covering it has to stay, and with use_spacer
+        crowded ships can't get past each other. Moving several ships at once lets the chain reassign hits, e.g. from
+        one long ship to three short ones, and swap ships. See propose for the proposal.
+        """
+        state, masks, blocks = self.state, self.masks, self.blocks
+        covered, blocked = 0, 0  # of the ships outside the block
+        for j, i in enumerate(state):
+            if j not in block:
+                covered |= masks[j][i]
+                blocked |= blocks[j][i]
+        need = self.hits & ~covered
+        order = block.copy()
+        self.rng.shuffle(order)  # order of the ships no hit is left for, chosen independent of the state
+        placed, options = self.propose(order, blocked, need)
+        if placed is None:
+            return
+        _, current = self.propose(order, blocked, need, {k: state[k] for k in block})
+        if self.rng.random() * current < options:  # accept with min(1, q(current) / q(new))
+            for k, i in placed.items():
+                state[k] = i
+                covered |= masks[k][i]
+            self.covered = covered
+
+    def propose(self, order: list[int], blocked: int, need: int, target: dict = None) -> tuple[dict or None, int]:
+        """
+        Parameters:
+            order: list[int], ships to place
+            blocked: int, fields the ships may not use
+            need: int, hits the ships have to cover
+            target: dict or None, ship -> placement, a layout of the ships to replay instead of drawing one
+        Places the ships one by one, each uniformly among the legal options. While hits are uncovered, the option is
+        any unplaced ship through the lowest uncovered hit, then the ships left take their turn in order.
+        Ships don't overlap, so every layout is reached on one path only and the proposal probability is the inverse of
+        the product of the numbers of options on it. Returns the placements and that product, None and 0 if the ships
+        got stuck.
+        """
+        masks, blocks, tables, allowed = self.masks, self.blocks, self.tables, self.allowed
+        placed, product = {}, 1
+        while len(placed) < len(order):
+            if need:
+                h = (need & -need).bit_length() - 1
+                options = [(a, i) for a in order if a not in placed for i in tables[a].by_cell[h]
+                           if allowed[a][i] and not masks[a][i] & blocked]
+                count = len(options)
+            else:
+                a = next(a for a in order if a not in placed)
+                count = list(map(blocked.__and__, self.domain_masks[a])).count(0)  # legal placements, counted in C
+            if not count:
+                return None, 0
+            product *= count
+            if target is not None:  # the ship of target that covers the hit, there is exactly one
+                a = next(a for a in order if a not in placed and masks[a][target[a]] >> h & 1) if need else a
+                i = target[a]
+            elif need:
+                a, i = options[int(self.rng.random() * count)]
+            else:
+                i = self.pick(a, blocked, count)
+            placed[a] = i
+            blocked |= blocks[a][i]
+            need &= ~masks[a][i]
+        if need:
+            return None, 0
+        return placed, product
+
+    def pick(self, k: int, blocked: int, count: int) -> int:
+        # uniformly chosen placement of ship k that is legal given blocked, count of them are
+        domain, masks, random = self.domains[k], self.masks[k], self.rng.random
+        if count * 8 >= len(domain):  # uniform proposals are accepted if legal
+            while True:
+                i = domain[int(random() * len(domain))]
+                if not masks[i] & blocked:
+                    return i
+        options = [i for i in domain if not masks[i] & blocked]
+        return options[int(random() * count)]
+
+    def sweep(self, weights=None):
+        # every ship once, then a random pair and a random block of three up to all ships, see step for weights
+        n = len(self.ships)
+        for k in range(n):
+            self.step(k, weights[k] if weights is not None else None)
+        if n > 1:
+            self.block_step(self.rng.sample(range(n), 2))
+        if n > 2:
+            self.block_step(self.rng.sample(range(n), self.rng.randint(3, n)))
+
+    def sample(self, count: int, burn: int, deadline=None) -> tuple[list[float], int]:
+        """
+        Parameters:
+            count: int, number of sweeps
+            burn: int, sweeps discarded first if the state is fresh
+            deadline: int or None, perf_counter_ns() after which no further sweep is started, one is always made
+        Returns the expected number of ships afloat on each field, summed over the sweeps, and the number of sweeps.
+        """
+        counts = [0.] * self.size
+        if self.state is None and not self.construct():
+            return counts, 0
+        for _ in range(burn if self.fresh else 0):
+            if deadline is not None and perf_counter_ns() >= deadline:
+                break
+            self.sweep()
+        self.fresh = False
+        lengths = {}  # ships of one length share their weights
+        weights = [lengths.setdefault(ship, [0.] * self.tables[k].count) if self.afloat[k] else None
+                   for k, ship in enumerate(self.ships)]
+        n = 0
+        while n < count and (not n or deadline is None or perf_counter_ns() < deadline):  # one sweep at least
+            self.sweep(weights)
+            n += 1
+        for ship, w in lengths.items():
+            cells = self.tables[self.ships.index(ship)].cells
+            for i, x in enumerate(w):
+                if x:
+                    for cell in cells[i * ship:(i + 1) * ship]:
+                        counts[cell] += x
+        return counts, n
+
+
+def sample_layouts(task: tuple) -> tuple[list[float], int]:  # module level, runs one chain in a pool worker
+    *settings, seed, count, burn, deadline = task
+    return LayoutSampler(*settings, Random(seed)).sample(count, burn, deadline)
+
+
+class MonteCarlo(GameUtil):
+    """
+    Estimates the probability of a hit on every field from fleet layouts sampled from the posterior, see
+    LayoutSampler, and shoots at the most likely field.
+    The cost of a shot is set by samples, the number of Gibbs sweeps, and by budget, seconds per shot, whichever runs
+    out first. With workers > 1 the sweeps are split across a process pool of that size, each process runs its own
+    chain. Pool workers can't start processes of their own, so MPGame and Tournament need workers=0.
+    """
+    def __init__(self, ships: list, inst: BaseGame, samples=200, budget=None, workers=0, burn=20, rng=None):
+        super().__init__()
+        self.game = inst
+        if rng is not None:
+            self.rng = rng
+        self.ships = ships
+        self.samples = samples
+        self.budget = budget
+        self.workers = workers
+        self.burn = burn  # sweeps discarded after a chain was started from a new layout
+        self.name = "MonteCarlo"
+        self.pool = None  # started on first use
+        # what has been seen of the opponent's board
+        self.hits = 0
+        self.misses = 0
+        self.sunk = []  # (field, length) of every sunken ship
+        self.state = None  # layout the chain of this process stopped at, continued on the next shot
+        self.counts = []  # expected ships afloat on each field summed over the sweeps of the last shot
+        self.deadline = None
+
+    def placement(self):
+        self.game.random_placement(self.ships)
+
+    def shoot(self, inst):  # method for giving user output to shots
+        print("\nThis is MonteCarlos board:")
+        inst.render()
+        pos = self.get_shot(inst)
+        print(f"{self.name} chooses {self.convert_back(pos)}.")
+        inst.game.shoot(pos)
+        if inst.game.last_shot:  # if flag last_shot is true something was hit
+            print("It's a hit!")
+        else:
+            print("It's a miss!")  # else its a miss
+        self.observe(inst, pos)
+
+    def shoot_nc(self, inst):  # shoot without any output, for speed tests
+        pos = self.get_shot(inst)
+        inst.game.shoot(pos)
+        self.observe(inst, pos)
+
+    def shoot_within(self, inst, budget: float):  # budget replaces self.budget for this shot
+        self.deadline = perf_counter_ns() + int(budget * 1e9)
+        self.shoot_nc(inst)
+        self.deadline = None
+
+    def get_shot(self, inst) -> int:
+        deadline = self.deadline
+        if deadline is None and self.budget is not None:
+            deadline = perf_counter_ns() + int(self.budget * 1e9)
+        settings = inst.game.length, inst.game.height, self.ships, inst.game.use_spacer, self.hits, self.misses, \
+            self.sunk
+        if self.workers > 1:
+            if self.pool is None:
+                self.pool = Pool(self.workers)
+            tasks = [(*settings, self.rng.getrandbits(64), -(-self.samples // self.workers), self.burn, deadline)
+                     for _ in range(self.workers)]
+            counts = [0.] * inst.game.size
+            for c, _ in self.pool.map(sample_layouts, tasks):
+                counts = [a + b for a, b in zip(counts, c)]
+        else:
+            sampler = LayoutSampler(*settings, self.rng, self.state)
+            counts, _ = sampler.sample(self.samples, self.burn, deadline)
+            self.state = sampler.state
+        self.counts = counts
+        shots = inst.game.shots_view
+        unshot = [x for x in range(inst.game.size) if not shots[x]]
+        best = max(unshot, key=counts.__getitem__)
+        if not counts[best]:  # no layout found within the search limit
+            return unshot[self.rng.randint(0, len(unshot) - 1)]
+        return best
+
+    def observe(self, inst, pos: int):
+        if inst.game.last_shot:
+            self.hits |= 1 << pos
+            if inst.game.ship_sunk:
+                self.sunk.append((pos, inst.game.length_ship_sunk))
+        else:
+            self.misses |= 1 << pos
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.sunk = []
+        self.state = None
+        self.counts = []
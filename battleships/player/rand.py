@@ -1,16 +1,17 @@
-
-from random import randint
-
 from battleships.core.base import BaseGame
 from battleships.util.util import GameUtil
 
 
 class Rand(GameUtil):
-    def __init__(self, ships: list, inst: BaseGame, fodder=False):
+    def __init__(self, ships: list, inst: BaseGame, fodder=False, rng=None):
         super().__init__()
         self.game = inst
+        if rng is not None:
+            self.rng = rng
         self.ships = ships
-        self.shots = list(range(self.game.size))
+        self.fields = tuple(range(self.game.size))
+        self.shots = list(self.fields)  # fields in the first self.left entries have not been shot yet
+        self.left = self.game.size
         self.name = "Random"
         self.fodder = fodder  # disables the render function for testing
 
@@ -22,7 +23,7 @@ class Rand(GameUtil):
             inst.render = lambda *_: None  # replace render with empty lambda
         print("\nThis is randoms board:")
         inst.render()
-        pos = self.shots.pop(randint(0, len(self.shots) - 1))
+        pos = self.next_shot()
         print(f"{self.name} chooses {self.convert_back(pos)}.")
         inst.game.shoot(pos)
         if inst.game.last_shot:  # if flag last_shot is true something was hit
@@ -31,8 +32,23 @@ class Rand(GameUtil):
             print("It's a miss!")  # else its a miss
 
     def shoot_nc(self, inst):  # shoot without any output, for speed tests
-        pos = self.shots.pop(randint(0, len(self.shots) - 1))
+        pos = self.next_shot()
         inst.game.shoot(pos)
 
+    def next_shot(self) -> int:
+        """
+        Streamed Fisher-Yates, one step per shot: a random field of the ones not shot yet is swapped behind them.
+        Each game shoots along a uniformly random permutation of the board, O(1) per shot.
+        """
+        left = self.left - 1
+        i = self.rng.randint(0, left)
+        self.left = left
+        shots = self.shots
+        pos = shots[i]
+        shots[i] = shots[left]
+        shots[left] = pos
+        return pos
+
     def reset(self):
-        self.shots = list(range(self.game.size))
+        self.shots[:] = self.fields  # reused in place, restoring the order keeps seeded episodes independent
+        self.left = self.game.size
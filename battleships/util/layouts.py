@@ -0,0 +1,148 @@
+"""
+Library of pre-generated fleet layouts, run as python -m battleships.util.layouts to generate one ahead of time.
+"""
+from argparse import ArgumentParser
+from random import Random
+import numpy as np
+import os
+
+from battleships.core.base import BaseGame
+
+
+class LayoutLibrary:
+    """
+    Fleet layouts of one board size, fleet and spacer setting, stored as one record per layout in a binary file.
+    A record holds the placement index of every ship in fleet order (ascending length, like Selector), see
+    core.placement.Placements, so a layout of the classic fleet on 10 x 10 takes 5 bytes.
+    Layouts are read through numpy.memmap, drawing one costs the same for ten or ten million stored layouts.
+
+    mode "sequential" draws layouts like BaseGame.random_placement, ship after ship uniformly among the placements
+    still legal for it. That is not uniform over all layouts, a layout is drawn more often the fewer options it left
+    to the ships placed after the first one.
+    mode "uniform" draws every ship uniformly among all of its placements and rejects fleets that aren't legal, which
+    is uniform over all legal layouts.
+    """
+    modes = ("sequential", "uniform")
+
+    def __init__(self, path: str, size: tuple[int, int], ships: list[int], use_spacer: bool, mode="sequential"):
+        if mode not in self.modes:
+            raise ValueError(f"LayoutLibrary supports the modes {self.modes}, {mode} was given.")
+        self.path = path
+        self.size = tuple(size)
+        self.ships = sorted(ships)
+        self.use_spacer = bool(use_spacer)
+        self.mode = mode
+        self.game = BaseGame(self.size, self.use_spacer)  # validates the settings
+        self.tables = [self.game.get_placements(ship) for ship in self.ships]
+        most = max((table.count for table in self.tables), default=0)
+        self.dtype = np.dtype(np.uint8 if most <= 256 else np.uint16 if most <= 65536 else np.uint32)
+        self.__records = None
+
+    @property
+    def file(self) -> str:
+        name = f"{self.size[0]}x{self.size[-1]}_{'-'.join(map(str, self.ships))}" \
+               f"{'_spacer' if self.use_spacer else ''}_{self.mode}.bin"
+        return os.path.join(self.path, name)
+
+    @property
+    def records(self) -> np.ndarray:
+        """
+        All stored layouts as read only (layouts x ships) memory map, mapped on first use.
+        """
+        if self.__records is None:
+            records = np.memmap(self.file, dtype=self.dtype, mode="r")
+            self.__records = records.reshape(-1, len(self.ships))
+        return self.__records
+
+    def __len__(self) -> int:
+        if not os.path.isfile(self.file):
+            return 0
+        return os.path.getsize(self.file) // (self.dtype.itemsize * len(self.ships))
+
+    def layout(self, i: int) -> list[int]:
+        """
+        Parameters:
+            i: int, taken modulo the number of stored layouts
+        Returns the placement indices of layout i, see BaseGame.set_placements.
+        """
+        records = self.records
+        return records[i % len(records)].tolist()
+
+    def fleet(self, i: int) -> list[list[int]]:
+        """
+        Parameters:
+            i: int
+        Returns the ships of layout i as lists of fields, like BaseGame.ships.
+        """
+        return [table.placement(p) for table, p in zip(self.tables, self.layout(i))]
+
+    def ensure(self, count: int, seed=0):
+        """
+        Parameters:
+            count: int
+            seed: int
+        Generates the library if it holds less than count layouts.
+        """
+        if len(self) < count:
+            self.generate(count, seed)
+
+    def generate(self, count: int, seed=0, block: int = 65536):
+        """
+        Parameters:
+            count: int, number of layouts
+            seed: int, the same seed always gives the same library
+            block: int, number of layouts written at once
+        Replaces the library with count new layouts.
+        """
+        rng = Random(f"{seed}:{self.mode}")
+        draw = self.sequential if self.mode == "sequential" else self.uniform
+        self.__records = None
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.file, "wb") as file:
+            for start in range(0, count, block):
+                layouts = [draw(rng) for _ in range(min(block, count - start))]
+                np.array(layouts, dtype=self.dtype).reshape(-1, len(self.ships)).tofile(file)
+
+    def sequential(self, rng: Random) -> list[int]:
+        # one layout drawn by BaseGame.random_placement
+        self.game.seed(rng.getrandbits(64))
+        self.game.reset()
+        self.game.random_placement(self.ships)
+        return [table.find(ship) for table, ship in zip(self.tables, self.game.ships)]
+
+    def uniform(self, rng: Random, tries: int = 1000000) -> list[int]:
+        # independent uniform placements until they form a legal fleet
+        order = sorted(range(len(self.ships)), key=lambda k: -self.ships[k])  # long ships first, they fail most
+        for _ in range(tries):
+            blocked = 0
+            ids = [0] * len(self.ships)
+            for k in order:
+                table = self.tables[k]
+                i = rng.randint(0, table.count - 1)
+                if table.masks[i] & blocked:
+                    break
+                blocked |= table.halos[i] if self.use_spacer else table.masks[i]
+                ids[k] = i
+            else:
+                return ids
+        raise RecursionError(f"No legal layout found in {tries} tries. Increase the field size or decrease the number "
+                             "or length of ships.")
+
+
+def main(argv=None):
+    parser = ArgumentParser(prog="python -m battleships.util.layouts", description="Generates a layout library.")
+    parser.add_argument("path", help="directory of the library")
+    parser.add_argument("--size", type=int, nargs=2, default=[10, 10])
+    parser.add_argument("--ships", type=int, nargs="+", default=[5, 4, 3, 3, 2])
+    parser.add_argument("--spacer", action="store_true")
+    parser.add_argument("--mode", choices=LayoutLibrary.modes, default="sequential")
+    parser.add_argument("-n", "--count", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    library = LayoutLibrary(args.path, tuple(args.size), args.ships, args.spacer, args.mode)
+    library.generate(args.count, args.seed)
+    print(f"{len(library)} layouts written to {library.file}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Recording of a player's view of every game, rendered away from the game loop.
+"""
+from multiprocessing import Process, Queue, current_process
+from threading import Thread
+import queue as threads
+import numpy as np
+import os
+
+
+class Monitor:
+    """
+    Collects snapshots of named fields (score map, shots, ...) shot by shot and writes every game as a single file.
+    Snapshots are put in a queue and rendered by a background process, the game loop only pays for copying the fields.
+    Pool workers may not start processes, there a thread renders instead.
+    format "npz" stores every field as a (frames x height x length) array, plus the shot number of each frame.
+    format "gif" animates the fields, all games are drawn on one reused figure.
+    With every = n only every n-th shot of a game is recorded.
+    """
+    formats = ("npz", "gif")
+
+    def __init__(self, path: str, length: int, every=1, format="npz", fps=4, figsize=(10, 10), queue_size=1024):
+        if format not in self.formats:
+            raise ValueError(f"Monitor supports the formats {self.formats}, {format} was given.")
+        self.path = path
+        self.length = length
+        self.every = every
+        self.format = format
+        self.fps = fps
+        self.figsize = figsize
+        self.queue_size = queue_size  # snapshots waiting for the renderer, the game loop blocks once it is full
+        self.shot = 0  # shots of the current game
+        self.queue = None  # the renderer is started on the first snapshot
+        self.worker = None
+
+    def start(self):
+        os.makedirs(self.path, exist_ok=True)
+        settings = self.path, self.length, self.format, self.fps, self.figsize
+        if current_process().daemon:
+            self.queue = threads.Queue(self.queue_size)
+            self.worker = Thread(target=render, args=(self.queue, *settings))
+        else:
+            self.queue = Queue(self.queue_size)
+            self.worker = Process(target=render, args=(self.queue, *settings))
+        self.worker.start()
+
+    def push(self, fields: dict):
+        """
+        Parameters:
+            fields: dict, title -> list or array of one value per field of the board
+        Records a snapshot of fields, unless the shot is skipped by frame sampling.
+        """
+        if not self.shot % self.every:
+            if self.queue is None:
+                self.start()
+            self.queue.put(("frame", self.shot, {title: np.array(v) for title, v in fields.items()}))
+        self.shot += 1
+
+    def end(self, name: str):
+        """
+        Parameters:
+            name: str, file name of the game without extension
+        Ends the current game, the renderer writes it to path/name.npz or path/name.gif.
+        """
+        if self.queue is not None:
+            self.queue.put(("end", name))
+        self.shot = 0
+
+    def close(self):
+        # waits until every game is written, a later snapshot starts a new renderer
+        if self.queue is not None:
+            self.queue.put(None)
+            self.worker.join()
+            self.queue, self.worker = None, None
+
+
+def render(queue, path: str, length: int, format: str, fps: int, figsize: tuple):
+    # runs in the background, collects the frames of a game and writes them once it ended
+    shots, frames = [], {}
+    animation = None
+    while True:
+        message = queue.get()
+        if message is None:
+            return
+        if message[0] == "frame":
+            _, shot, fields = message
+            shots.append(shot)
+            for title, v in fields.items():
+                frames.setdefault(title, []).append(v.reshape(-1, length))
+            continue
+        _, name = message
+        if shots and format == "npz":
+            np.savez_compressed(os.path.join(path, f"{name}.npz"), shot=np.array(shots),
+                                **{title.lower().replace(" ", "_"): np.stack(v) for title, v in frames.items()})
+        elif shots:
+            if animation is None or animation.titles != list(frames):
+                animation = Animation(list(frames), length, len(frames[next(iter(frames))][0]), figsize)
+            animation.save(frames, len(shots), os.path.join(path, f"{name}.gif"), fps)
+        shots, frames = [], {}
+
+
+class Animation:
+    """
+    One figure with a mesh per field, frames are drawn by updating the meshes instead of creating new plots.
+    """
+    def __init__(self, titles: list[str], length: int, height: int, figsize: tuple):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg  # only the renderer needs matplotlib
+        from matplotlib.figure import Figure
+
+        self.titles = titles
+        rows = int(np.ceil(np.sqrt(len(titles))))
+        columns = int(np.ceil(len(titles) / rows))
+        self.figure = Figure(figsize=figsize)
+        FigureCanvasAgg(self.figure)
+        axes = self.figure.subplots(rows, columns, squeeze=False).ravel()
+        self.meshes = []
+        for ax, title in zip(axes, titles):
+            self.meshes.append(ax.pcolormesh(np.zeros((height, length)), edgecolors="k", linewidth=.3, cmap="gray_r"))
+            ax.title.set_text(title)
+            ax.axis("off")
+            ax.set_aspect(1)
+        for ax in axes[len(titles):]:
+            ax.axis("off")
+
+    def draw(self, fields: list[np.ndarray]):
+        for mesh, v in zip(self.meshes, fields):
+            v = v[::-1]  # first row at the top
+            mesh.set_array(v)
+            mesh.set_clim(0, max(v.max() + v.max() // 3.5, 1))
+
+    def save(self, frames: dict, count: int, file: str, fps: int):
+        from matplotlib.animation import PillowWriter
+
+        writer = PillowWriter(fps=fps)
+        with writer.saving(self.figure, file, dpi=self.figure.dpi):
+            for n in range(count):
+                self.draw([frames[title][n] for title in self.titles])
+                writer.grab_frame()
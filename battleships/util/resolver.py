@@ -0,0 +1,91 @@
+class SunkResolver:
+    """
+    Decides which fields belong to sunken ships when their position is not certain.
+    Each sunken ship comes with a list of candidate placements as bitmasks, ships may not overlap.
+    Forced placements are propagated first, the rest is solved by backtracking with the most constrained ship first.
+    Search is capped at max_nodes, so clustered boards can't stall the game. Results are cached per state.
+    """
+    def __init__(self, max_nodes: int = 20000, cache_size: int = 4096):
+        self.max_nodes = max_nodes
+        self.cache_size = cache_size
+        self.cache = {}
+        self.nodes = 0
+
+    def solve(self, candidates: list[list[int]]) -> list[int or None]:
+        """
+        Parameters:
+            candidates: list[list[int]], candidate masks for each sunken ship
+        Returns for each ship the index of its placement in candidates if it is the same in every valid assignment,
+        None if it is ambiguous. If no valid assignment exists or the search runs out of nodes, only placements that
+        are forced by propagation are returned.
+        """
+        key = tuple(tuple(c) for c in candidates)
+        if key in self.cache:
+            return [*self.cache[key]]
+        result = self.__solve(candidates)
+        if len(self.cache) >= self.cache_size:
+            self.cache.clear()  # cheap bound on memory, states rarely come back after a game moved on
+        self.cache[key] = result
+        return [*result]
+
+    def __solve(self, candidates: list[list[int]]) -> list[int or None]:
+        domains = [list(range(len(c))) for c in candidates]  # remaining candidate indices of each ship
+        forced = self.__propagate(candidates, domains)
+        if forced is None:  # contradiction, nothing can be said
+            return [None] * len(candidates)
+
+        order = sorted((i for i in range(len(candidates)) if forced[i] is None), key=lambda i: len(domains[i]))
+        # most constrained ship first, prunes the most
+        used = 0
+        for i, choice in enumerate(forced):
+            if choice is not None:
+                used |= candidates[i][choice]
+        seen = [set() for _ in candidates]  # placements of each ship over all valid assignments
+        assignment = [None] * len(candidates)
+        self.nodes = 0
+        if not self.__search(candidates, domains, order, 0, used, assignment, seen):
+            return forced  # out of nodes, only propagation results are certain
+        if not any(seen[i] for i in order) and order:
+            return forced  # no valid assignment at all
+        return [forced[i] if forced[i] is not None else (next(iter(seen[i])) if len(seen[i]) == 1 else None)
+                for i in range(len(candidates))]
+
+    @staticmethod
+    def __propagate(candidates: list[list[int]], domains: list[list[int]]) -> list[int or None] or None:
+        # fixes ships with a single candidate and removes overlapping candidates from all others, until nothing changes
+        forced = [None] * len(candidates)
+        changed = True
+        while changed:
+            changed = False
+            for i, domain in enumerate(domains):
+                if not domain:
+                    return None
+                if len(domain) == 1 and forced[i] is None:
+                    forced[i] = domain[0]
+                    mask = candidates[i][domain[0]]
+                    for j, other in enumerate(domains):
+                        if j != i:
+                            pruned = [x for x in other if not candidates[j][x] & mask]
+                            if len(pruned) != len(other):
+                                domains[j] = pruned
+                                changed = True
+        return forced
+
+    def __search(self, candidates, domains, order, depth, used, assignment, seen) -> bool:
+        # depth first search over all assignments, records every placement used by a valid one
+        # returns False if the node budget is exhausted
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            return False
+        if depth == len(order):
+            for i in order:
+                seen[i].add(assignment[i])
+            return True
+        i = order[depth]
+        for x in domains[i]:
+            mask = candidates[i][x]
+            if not mask & used:
+                assignment[i] = x
+                if not self.__search(candidates, domains, order, depth + 1, used | mask, assignment, seen):
+                    return False
+        return True
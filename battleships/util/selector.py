@@ -1,12 +1,17 @@
 
+from random import Random
+
 from battleships.core.base import BaseGame
 from battleships.player.rand import Rand
 from battleships.player.human import HumanIO
 from battleships.player.hunter import Hunter
 from battleships.player.dense import Dense
+from battleships.player.montecarlo import MonteCarlo
 
 
 class Selector:
+    streams = 0  # random streams handed out so far, see rng()
+
     def __init__(self):
         if type(self) == Selector:  # useless if not inherited, placeholders will be None, must be overwritten
             raise NotImplementedError("This class must be subclassed and may not be instanced directly.")
@@ -14,15 +19,18 @@ class Selector:
         self.ships = None
         self.use_spacer = None
         self.size = None  # placeholders
+        self.bitboard = False  # optional, may be overwritten
+        self.seed = None  # optional, instances get their own random streams derived from it
 
     def __pre_process(self):
         self.ships.sort()
         self.use_spacer = bool(self.use_spacer)
         self.size = tuple(int(x) for x in self.size)
+        self.bitboard = bool(self.bitboard)
 
     def random(self, _=None):  # each returns an instance of the class described
         self.__pre_process()
-        return Rand(self.ships, self.base())
+        return Rand(self.ships, self.base(), rng=self.rng())
 
     def human_io(self, name):
         self.__pre_process()
@@ -30,12 +38,22 @@ class Selector:
 
     def hunter(self, _=None):
         self.__pre_process()
-        return Hunter(self.ships, self.base())
+        return Hunter(self.ships, self.base(), self.rng())
 
-    def dense(self, id_=0, monitor=False):
+    def dense(self, id_=0, monitor=False, vectorize=True):
         self.__pre_process()
-        return Dense(self.ships, self.base(), id_, monitor)
+        return Dense(self.ships, self.base(), id_, monitor, vectorize)
+
+    def montecarlo(self, _=None, samples=200, budget=None, workers=0):
+        self.__pre_process()
+        return MonteCarlo(self.ships, self.base(), samples, budget, workers, rng=self.rng())
 
     def base(self):  # provides the BaseGame instance for other functions
         self.__pre_process()
-        return BaseGame(self.size, self.use_spacer)
+        return BaseGame(self.size, self.use_spacer, self.bitboard, self.rng())
+
+    def rng(self):  # a new random stream for every instance if seed is set, else the global random module is used
+        if self.seed is None:
+            return None
+        self.streams += 1
+        return Random(f"{self.seed}:{self.streams}")
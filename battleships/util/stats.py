@@ -0,0 +1,139 @@
+from math import sqrt
+
+
+class Running:
+    """
+    Running count, mean, variance (Welford), minimum and maximum of a stream of numbers.
+    Instances of different processes can be merged.
+    """
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.
+        self.m2 = 0.  # sum of squared differences from the mean
+        self.min = None
+        self.max = None
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        self.min = x if self.min is None or x < self.min else self.min
+        self.max = x if self.max is None or x > self.max else self.max
+
+    def merge(self, other: "Running"):
+        if not other.n:
+            return
+        if not self.n:
+            self.n, self.mean, self.m2, self.min, self.max = other.n, other.mean, other.m2, other.min, other.max
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n  # parallel variant of Welford (Chan et al.)
+        self.m2 += other.m2 + delta ** 2 * self.n * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.
+
+    @property
+    def std(self) -> float:
+        return sqrt(self.variance)
+
+
+class GameStats:
+    """
+    Streaming summary of the results of MPLoop, memory use does not depend on the number of games.
+    Keeps wins, forfeits, hits, misses and game length as running values, a per field hit count for each player and
+    at most (keep) configs of player 2 for the shortest and the longest games, like MPGame.write_config.
+    """
+    def __init__(self, size: int, keep: int = 100):
+        self.size = size
+        self.keep = keep
+        self.episodes = 0
+        self.wins = [0, 0]
+        self.forfeits = [0, 0]
+        self.hits = [Running(), Running()]  # hits and misses of each player's shots
+        self.misses = [Running(), Running()]
+        self.length = Running()
+        self.heatmap = [[0] * size, [0] * size]  # how often each field was hit by each player
+        self.low = []
+        self.longest = []  # configs of the longest games, even if they are as short as the shortest, see high
+
+    def add(self, win: int, shots_p1: list[int], shots_p2: list[int], length: int, config_p1, config_p2):
+        """
+        Folds a single game into the summary, arguments are the values MPLoop.extract collects.
+        """
+        self.episodes += 1
+        self.wins[win] += 1
+        for i, shots in enumerate((shots_p1, shots_p2)):
+            hits, misses = 0, 0
+            heatmap = self.heatmap[i]
+            for x, shot in enumerate(shots):
+                if shot == 1:
+                    hits += 1
+                    heatmap[x] += 1
+                elif shot == 2:
+                    misses += 1
+            self.hits[i].add(hits)
+            self.misses[i].add(misses)
+
+        low, high = self.length.min, self.length.max
+        self.length.add(length)
+        self.low = self.__extreme(self.low, low, length, config_p2, length < low if low is not None else True)
+        self.longest = self.__extreme(self.longest, high, length, config_p2,
+                                      length > high if high is not None else True)
+
+    @property
+    def high(self) -> list:
+        # like MPGame.write_config, games as short as the shortest one are only listed in low
+        return [] if self.length.min == self.length.max else self.longest
+
+    def forfeit(self, num: int):
+        self.forfeits[num] += 1
+
+    def add_results(self, result: tuple):
+        """
+        Folds a complete result tuple of MPLoop.game_loop into the summary.
+        """
+        wins, shots_p1, shots_p2, game_length, config_p1, config_p2, ff_p1, ff_p2 = result
+        for game in zip(wins, shots_p1, shots_p2, game_length, config_p1, config_p2):
+            self.add(*game)
+        self.forfeits[0] += sum(ff_p1)
+        self.forfeits[1] += sum(ff_p2)
+
+    def __extreme(self, configs, old, length, config, new):
+        # restarts the list if a new extreme was found, appends if the extreme was matched
+        if new:
+            return [config]
+        if length == old and len(configs) < self.keep:
+            configs.append(config)
+        return configs
+
+    def merge(self, other: "GameStats"):
+        """
+        Merges the summary of another process into this one.
+        """
+        low, high = self.length.min, self.length.max
+        self.low = self.__merge_extreme(self.low, low, other.low, other.length.min, lambda a, b: a < b)
+        self.longest = self.__merge_extreme(self.longest, high, other.longest, other.length.max, lambda a, b: a > b)
+        self.episodes += other.episodes
+        for i in range(2):
+            self.wins[i] += other.wins[i]
+            self.forfeits[i] += other.forfeits[i]
+            self.hits[i].merge(other.hits[i])
+            self.misses[i].merge(other.misses[i])
+            self.heatmap[i] = [a + b for a, b in zip(self.heatmap[i], other.heatmap[i])]
+        self.length.merge(other.length)
+
+    def __merge_extreme(self, configs, value, other_configs, other_value, better):
+        if other_value is None:
+            return configs
+        if value is None or better(other_value, value):
+            return [*other_configs]
+        if value == other_value:
+            return (configs + other_configs)[:self.keep]
+        return configs
@@ -0,0 +1,161 @@
+import numpy as np
+import os
+
+from battleships.util.stats import Running, GameStats
+
+
+class ResultStore:
+    """
+    Append-only binary store for game results, one fixed width numpy record per game.
+    Records hold the winner, the game length, forfeit flags, both shot boards packed to 2 bits per field
+    (0 not shot, 1 hit, 2 miss) and both ship configs as fields in fleet order.
+    Every process appends to its own file in directory (path), reading maps all files with numpy.memmap.
+    """
+    def __init__(self, path: str, size: int, ships: list[int], flush: int = 4096):
+        self.path = path
+        self.size = size
+        self.ships = sorted(ships)  # order ships are placed and stored in
+        self.flush_at = flush
+        self.packed = -(-size // 4)  # bytes per shot board, rounded up
+        field = np.uint16 if size <= np.iinfo(np.uint16).max else np.uint32
+        self.dtype = np.dtype([
+            ("winner", np.uint8),
+            ("length", field),
+            ("ff_p1", np.uint8),
+            ("ff_p2", np.uint8),
+            ("shots_p1", np.uint8, (self.packed,)),
+            ("shots_p2", np.uint8, (self.packed,)),
+            ("config_p1", field, (sum(self.ships),)),
+            ("config_p2", field, (sum(self.ships),)),
+        ])
+        self.buffer = []
+        self.count = 0  # records written by this instance
+
+    @property
+    def file(self) -> str:
+        return os.path.join(self.path, f"{os.getpid()}.bin")  # one file per process, no locking needed
+
+    def add(self, win, shots_p1, shots_p2, length, config_p1, config_p2, ff_p1, ff_p2):
+        """
+        Buffers a single game, arguments are the values MPLoop.extract collects.
+        Buffered games are written once flush is reached.
+        """
+        self.buffer.append((win, shots_p1, shots_p2, length, [x for ship in config_p1 for x in ship],
+                            [x for ship in config_p2 for x in ship], ff_p1, ff_p2))
+        if len(self.buffer) >= self.flush_at:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        wins, shots_p1, shots_p2, length, config_p1, config_p2, ff_p1, ff_p2 = zip(*self.buffer)
+        self.buffer = []
+        self.add_arrays(np.array(wins), np.array(shots_p1, dtype=np.uint8), np.array(shots_p2, dtype=np.uint8),
+                        np.array(length), np.array(config_p1), np.array(config_p2), np.array(ff_p1),
+                        np.array(ff_p2))
+
+    def add_arrays(self, wins, shots_p1, shots_p2, length, config_p1, config_p2, ff_p1=0, ff_p2=0):
+        """
+        Appends a batch of games given as arrays, shots as (games x size) and configs as (games x fleet fields).
+        """
+        records = np.zeros(len(wins), dtype=self.dtype)
+        records["winner"] = wins
+        records["length"] = length
+        records["ff_p1"] = ff_p1
+        records["ff_p2"] = ff_p2
+        records["shots_p1"] = self.pack(shots_p1)
+        records["shots_p2"] = self.pack(shots_p2)
+        records["config_p1"] = config_p1
+        records["config_p2"] = config_p2
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.file, "ab") as file:
+            records.tofile(file)
+        self.count += len(records)
+
+    def pack(self, shots: np.ndarray) -> np.ndarray:
+        # 4 fields per byte, field n of a byte is stored in bits 2n and 2n + 1
+        padded = np.zeros((len(shots), self.packed * 4), dtype=np.uint8)
+        padded[:, :self.size] = shots
+        padded = padded.reshape(len(shots), self.packed, 4)
+        return padded[..., 0] | padded[..., 1] << 2 | padded[..., 2] << 4 | padded[..., 3] << 6
+
+    def unpack(self, packed: np.ndarray) -> np.ndarray:
+        """
+        Parameters:
+            packed: np.ndarray, (games x packed bytes)
+        Returns the shot boards as (games x size) array of 0, 1 and 2.
+        """
+        shots = packed[..., None] >> np.array([0, 2, 4, 6], dtype=np.uint8) & 3
+        return shots.reshape(len(packed), -1)[:, :self.size]
+
+    def files(self) -> list[str]:
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(os.path.join(self.path, f) for f in os.listdir(self.path) if f.endswith(".bin"))
+
+    def clear(self):
+        """
+        Removes all record files of a previous run.
+        """
+        for file in self.files():
+            os.remove(file)
+
+    def read(self) -> list[np.memmap]:
+        """
+        Returns the records of every file as read only memory maps, nothing is parsed or loaded up front.
+        """
+        return [np.memmap(file, dtype=self.dtype, mode="r") for file in self.files()
+                if os.path.getsize(file) >= self.dtype.itemsize]
+
+    def config(self, fields) -> list[list[int]]:
+        # splits the stored fields of a config back into ships
+        ships, start = [], 0
+        for ship in self.ships:
+            ships.append([int(x) for x in fields[start:start + ship]])
+            start += ship
+        return ships
+
+    def stats(self, keep: int = 100, block: int = 65536) -> GameStats:
+        """
+        Parameters:
+            keep: int, maximum number of configs kept for the shortest and longest games
+            block: int, number of records processed at once
+        Summarises all stored games into a GameStats instance, memory use is bounded by block.
+        """
+        stats = GameStats(self.size, keep)
+        maps = self.read()
+        low = min((int(m["length"].min()) for m in maps), default=None)
+        high = max((int(m["length"].max()) for m in maps), default=None)
+        heatmap = [np.zeros(self.size, dtype=np.int64), np.zeros(self.size, dtype=np.int64)]
+        for records in maps:
+            for start in range(0, len(records), block):
+                part = records[start:start + block]
+                stats.episodes += len(part)
+                stats.wins[0] += int((part["winner"] == 0).sum())
+                stats.wins[1] += int((part["winner"] == 1).sum())
+                stats.forfeits[0] += int(part["ff_p1"].sum())
+                stats.forfeits[1] += int(part["ff_p2"].sum())
+                for i, name in enumerate(("shots_p1", "shots_p2")):
+                    shots = self.unpack(part[name])
+                    stats.hits[i].merge(self.running((shots == 1).sum(axis=1)))
+                    stats.misses[i].merge(self.running((shots == 2).sum(axis=1)))
+                    heatmap[i] += (shots == 1).sum(axis=0)
+                stats.length.merge(self.running(part["length"]))
+                for configs, value in ((stats.low, low), (stats.longest, high)):
+                    for fields in part["config_p2"][part["length"] == value][:keep - len(configs)]:
+                        configs.append(self.config(fields))
+        stats.heatmap = [h.tolist() for h in heatmap]
+        return stats
+
+    @staticmethod
+    def running(values: np.ndarray) -> Running:
+        # Running summary of a whole array, to be merged into another one
+        r = Running()
+        if len(values):
+            values = values.astype(np.float64)
+            r.n = len(values)
+            r.mean = float(values.mean())
+            r.m2 = float(((values - r.mean) ** 2).sum())
+            r.min = int(values.min())
+            r.max = int(values.max())
+        return r
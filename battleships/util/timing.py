@@ -0,0 +1,130 @@
+from array import array
+from time import perf_counter_ns
+import json
+
+
+class Phase:
+    """
+    Call count, total time and a histogram of the durations of one phase, in nanoseconds.
+    Bucket n of the histogram counts calls that took less than 2 ** n ns and at least 2 ** (n - 1) ns.
+    """
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.histogram = [0] * 64
+
+    def add(self, ns: int):
+        self.count += 1
+        self.total += ns
+        self.histogram[ns.bit_length()] += 1
+
+    def merge(self, other: "Phase"):
+        self.count += other.count
+        self.total += other.total
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+
+    def percentile(self, q: float) -> int:
+        # upper bound of the bucket holding the q-th percentile
+        rank = q * self.count
+        seen = 0
+        for n, calls in enumerate(self.histogram):
+            seen += calls
+            if calls and seen >= rank:
+                return 2 ** n
+        return 0
+
+
+def quantile(ordered, q: float) -> int:
+    # nearest rank of the q-th quantile of sorted samples, exact unlike Phase.percentile
+    if not len(ordered):
+        return 0
+    return ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + .5) - 1))]
+
+
+class Timings:
+    """
+    Per phase timings of MPLoop, the players and BaseGame, see MPLoop.instrument.
+    Methods are timed by replacing them with wrapped versions on the instance, nothing is wrapped and nothing is
+    recorded unless an instance is handed to MPLoop, so disabled timings cost nothing.
+    Phases nest, the time of a player's shoot_nc includes its get_shot and BaseGame.shoot.
+    Instances of different processes can be merged.
+    Turn latencies of time budgeted games are kept as raw samples instead, see latency.
+    """
+    quantiles = (.5, .9, .99, .999)
+
+    def __init__(self):
+        self.phases = {}
+        self.latencies = {}  # name -> array of latencies in ns, every sample is kept for exact percentiles
+
+    def wrap(self, func, name: str):
+        """
+        Parameters:
+            func: callable
+            name: str, phase the calls are recorded as
+        Returns a version of func recording the duration of every call.
+        """
+        add = self.phases.setdefault(name, Phase()).add
+
+        def timed(*args):
+            start = perf_counter_ns()
+            result = func(*args)
+            add(perf_counter_ns() - start)
+            return result
+        return timed
+
+    def latency(self, name: str):
+        """
+        Parameters:
+            name: str
+        Returns a function recording one latency in ns under name, 8 bytes per sample.
+        """
+        return self.latencies.setdefault(name, array("q")).append
+
+    def merge(self, other: "Timings"):
+        for name, phase in other.phases.items():
+            self.phases.setdefault(name, Phase()).merge(phase)
+        for name, samples in other.latencies.items():
+            self.latencies.setdefault(name, array("q")).extend(samples)
+
+    def percentiles(self, name: str) -> dict:
+        ordered = sorted(self.latencies[name])
+        data = {"count": len(ordered), "mean_ns": sum(ordered) / len(ordered) if ordered else 0}
+        for q in self.quantiles:
+            data[f"p{q * 100:g}_ns"] = quantile(ordered, q)
+        data["max_ns"] = ordered[-1] if ordered else 0
+        return data
+
+    def as_dict(self) -> dict:
+        latencies = {name: self.percentiles(name) for name in self.latencies}
+        return latencies | {name: {
+            "count": phase.count,
+            "total_ns": phase.total,
+            "mean_ns": phase.total / phase.count if phase.count else 0,
+            "p50_ns": phase.percentile(.5),
+            "p99_ns": phase.percentile(.99),
+            "histogram": phase.histogram[:max((n + 1 for n, x in enumerate(phase.histogram) if x), default=0)],
+        } for name, phase in self.phases.items()}
+
+    def dump(self, path: str):
+        with open(path, "w+") as file:
+            file.write(json.dumps(self.as_dict(), indent=4))
+
+    def report(self) -> str:
+        lines = []
+        if self.phases:
+            lines.append(f"{'Phase':<28}{'Calls':>12}{'Total ms':>12}{'Mean μs':>10}{'p50 μs':>10}{'p99 μs':>10}")
+        for name, phase in sorted(self.phases.items(), key=lambda x: -x[1].total):
+            lines.append(f"{name:<28}{phase.count:>12}{phase.total / 1e6:>12.1f}"
+                         f"{phase.total / max(phase.count, 1) / 1e3:>10.2f}{phase.percentile(.5) / 1e3:>10.2f}"
+                         f"{phase.percentile(.99) / 1e3:>10.2f}")
+        if self.latencies:
+            if lines:
+                lines.append("")
+            lines.append(f"{'Latency':<28}{'Samples':>12}{'Mean μs':>12}"
+                         + "".join(f"{f'p{q * 100:g} μs':>10}" for q in self.quantiles) + f"{'Max μs':>10}")
+            for name in sorted(self.latencies):
+                data = self.percentiles(name)
+                lines.append(f"{name:<28}{data['count']:>12}{data['mean_ns'] / 1e3:>12.2f}"
+                             + "".join(f"{data[f'p{q * 100:g}_ns'] / 1e3:>10.2f}" for q in self.quantiles)
+                             + f"{data['max_ns'] / 1e3:>10.2f}")
+        return "\n".join(lines)
@@ -1,10 +1,10 @@
-
-from _ctypes import PyObj_FromPtr
-from colorama import Style, Fore
+"""
+Shared helpers of the players and games. Importing this module stays cheap, numpy, colorama and _ctypes are imported
+on first use by the few functions that need them, see python -m battleships.bench imports.
+"""
 from collections import Counter
 
-import matplotlib.pyplot as plt
-import numpy as np
+import random
 import json
 import re
 
@@ -21,35 +21,43 @@ class GameUtil:
         self.name = None
         self.game = None
         self.alive = []
+        self.rng = random  # source of random shots, see seed()
 
         self.placeholder = '▣'
-        self.hit = Fore.RED + '¤' + Style.RESET_ALL
-        self.miss = Fore.GREEN + '○' + Style.RESET_ALL
-        # the characters
+        # the characters, hit and miss are colored, see below
 
-    @staticmethod
-    def monitor(fields: dict[str: list], field_length, name, figsize=(10, 10)):
-        length = len(fields)
-        rows = int(np.ceil(np.sqrt(length)))
-        columns = int(np.ceil(length / rows))
-        fig = plt.figure(figsize=figsize)
-        ax = fig.subplots(rows, columns)
-        row, col = 0, 0
-        for k, v in fields.items():
-            v = np.reshape(v, (-1, field_length))[::-1]
-            ax[row][col].pcolormesh(v, edgecolors="k", linewidth=.3, cmap="gray_r", vmin=0,
-                                    vmax=np.amax(v) + np.amax(v) // 3.5)  # colormesh in gray tone
-            ax[row][col].title.set_text(k)  # give it a title
-            ax[row][col].axis("off")  # set the axis to off
-            ax[row][col].set_aspect(1)
-            col += 1
-            if not col % columns:
-                row += 1
-                col = 0
-        for i in range(rows * columns - length):
-            ax[-1][-1-i].axis("off")
-        plt.savefig(name)
-        plt.close(fig)  # and close for good measure
+    def seed(self, key):
+        """
+        Parameters:
+            key: int, str or bytes
+        Seeds the random shots of the player and the placements of its game, each with a stream derived from key.
+        Players still using the global random module get their own random.Random first.
+        """
+        if self.rng is random:
+            self.rng = random.Random()
+        self.rng.seed(f"{key}:shots")
+        self.game.seed(f"{key}:placement")
+
+    def instrument(self, timings):
+        """
+        Parameters:
+            timings: util.timing.Timings
+        Records the durations of placement, shot selection, turns and reset of this player and of its game in timings.
+        """
+        for method in ("placement", "get_shot", "after_shot", "shoot_nc", "reset"):
+            if hasattr(self, method):  # after_shot is Dense only, Rand has no get_shot
+                setattr(self, method, timings.wrap(getattr(self, method), f"{self.name}.{method}"))
+        self.game.instrument(timings)
+
+    @property
+    def hit(self) -> str:
+        from colorama import Fore, Style
+        return Fore.RED + '¤' + Style.RESET_ALL
+
+    @property
+    def miss(self) -> str:
+        from colorama import Fore, Style
+        return Fore.GREEN + '○' + Style.RESET_ALL
 
     def render(self, win: int = 0):
         """
@@ -58,6 +66,8 @@ class GameUtil:
         Alters self.game.board and uses game.render to draw it.
         If win is True, all ships will be revealed.
         """
+        from colorama import Fore, Style
+
         # modify the board and call the BaseGame render method
         if not win:
             board = self.game.shots
@@ -85,6 +95,16 @@ class GameUtil:
     def placement(self):
         raise NotImplementedError
 
+    def shoot_within(self, inst, budget: float):
+        """
+        Parameters:
+            inst: Class, middle-layer instance of BaseGame
+            budget: float, seconds the shot may take
+        Takes a turn like shoot_nc, choosing the shot within budget. Players whose shots cost next to nothing ignore
+        the budget, anytime players like Dense override this and return the best shot found when time runs out.
+        """
+        self.shoot_nc(inst)
+
     def convert(self, pos: str) -> int:
         """
         Parameters:
@@ -174,6 +194,13 @@ class GameUtil:
         """
         pass
 
+    def close(self):
+        """
+        Releases what a player keeps running between games, e.g. processes. Called by MPLoop after the last episode,
+        the player stays usable.
+        """
+        pass
+
 
 class CalcUtil:
     def __init__(self):
@@ -196,6 +223,7 @@ class CalcUtil:
 
     @staticmethod
     def format_float(num):  # numpy float formatting, removes trailing zero's
+        import numpy as np
         return np.format_float_positional(float(num), trim='-')
 
 
@@ -224,6 +252,8 @@ class JSONFlatEncoder(json.JSONEncoder):  # https://stackoverflow.com/a/42721412
                 else super(JSONFlatEncoder, self).default(obj))
 
     def iterencode(self, obj, **kwargs):
+        from _ctypes import PyObj_FromPtr
+
         format_spec = self.FORMAT_SPEC  # Local var to expedite access.
 
         # Replace any marked-up NoIndent wrapped values in the JSON repr